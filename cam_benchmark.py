@@ -0,0 +1,265 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from cam_calib import CameraCalibration
+from cam_reprojection import undistort_normalized
+from cam_synthetic import SyntheticCheckerboard, default_camera
+from cam_undistort import PointUndistorter
+
+'''
+Benchmark of the calibration pipeline on synthetic checkerboard images.
+For every resolution and number of views, views of the CameraCalibration board are rendered from a known camera,
+and the corner detection, calibration, reprojection error, undistortion and keypoint undistortion are timed.
+The recovered camera is compared with the ground truth, a case fails when an error is above its tolerance.
+@checkerboard_size: Inner corners of the board (horizontal, vertical)
+@edge_length: Edge length of the squares
+@noise: Standard deviation of the gaussian pixel noise of the rendered images
+@undistortion_repeats: Number of undistorted frames timed after the maps are built
+@pyramid_levels: Coarse-to-fine detection levels passed to CameraCalibration
+@seed: Seed of the random poses and noise, the same seed renders the same images
+'''
+class CalibrationBenchmark:
+    def __init__(self, checkerboard_size=(6, 8), edge_length: float = 0.108, noise: float = 2.0, undistortion_repeats: int = 20, pyramid_levels: int = 0, seed: int = 0,
+                 max_focal_error: float = 0.005, max_center_error: float = 3.0, max_corner_rms: float = 0.3, max_undistortion_rms: float = 1.0, max_point_grid_error: float = 0.05):
+        self.checkerboard_size = tuple(checkerboard_size)
+        self.edge_length = edge_length
+        self.noise = noise
+        self.undistortion_repeats = undistortion_repeats
+        self.pyramid_levels = pyramid_levels
+        self.seed = seed
+        # Tolerances, focal length relative, the others in pixels
+        self.tolerances = {
+            'focal_error': max_focal_error,
+            'center_error': max_center_error,
+            'corner_rms': max_corner_rms,
+            'undistortion_rms': max_undistortion_rms,
+            'point_grid_max': max_point_grid_error,
+        }
+
+    def run(self, resolutions, view_counts):
+        cases = []
+        for image_size in resolutions:
+            for n_views in view_counts:
+                cases.append(self.run_case(image_size, n_views))
+        return {
+            'environment': environment(),
+            'settings': {
+                'checkerboard_size': list(self.checkerboard_size),
+                'edge_length': self.edge_length,
+                'noise': self.noise,
+                'pyramid_levels': self.pyramid_levels,
+                'seed': self.seed,
+                'tolerances': self.tolerances,
+            },
+            'cases': cases,
+            'passed': all(case['passed'] for case in cases),
+        }
+
+    def run_case(self, image_size, n_views: int):
+        width, height = image_size
+        true_cam_mat, true_dist_coeff = default_camera(image_size)
+        synthetic = SyntheticCheckerboard(self.checkerboard_size, self.edge_length, true_cam_mat, true_dist_coeff, image_size, noise=self.noise, seed=self.seed)
+
+        start_time = time.perf_counter()
+        views = synthetic.render_views(n_views)
+        render_time = time.perf_counter() - start_time
+
+        cam_calib = CameraCalibration(edge_length=self.edge_length, n_calib_images=n_views, n_vertical=self.checkerboard_size[1], n_horizontal=self.checkerboard_size[0],
+                                      pyramid_levels=self.pyramid_levels)
+        case = {
+            'resolution': '%dx%d' % (width, height),
+            'views': n_views,
+            'render_time': render_time,
+        }
+
+        # Detection, the prints of the pipeline are not part of the results
+        detection_times = []
+        corner_errors = np.empty((0,))
+        for image, true_corners, _, _ in views:
+            n_detected = len(cam_calib.imgpoints)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start_time = time.perf_counter()
+                cam_calib._find_checkerboard_corners(image)
+                detection_times.append(time.perf_counter() - start_time)
+            if len(cam_calib.imgpoints) > n_detected:
+                corner_errors = np.append(corner_errors, corner_errors_to_truth(cam_calib.imgpoints[-1], true_corners))
+        case['detection'] = timing_stats(detection_times)
+        case['detected_views'] = len(cam_calib.imgpoints)
+        case['accuracy'] = {
+            'corner_rms': float(np.sqrt(np.mean(corner_errors ** 2))) if len(corner_errors) else None,
+            'corner_max': float(corner_errors.max()) if len(corner_errors) else None,
+        }
+
+        if len(cam_calib.imgpoints) < 4:
+            case['error'] = 'Only %d of %d views detected.' % (len(cam_calib.imgpoints), n_views)
+            case['passed'] = False
+            return case
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            cam_calib.calibration()
+            case['calibration'] = {'time': time.perf_counter() - start_time}
+
+            start_time = time.perf_counter()
+            errors = cam_calib.reprojection_error()
+            case['reprojection_error'] = {'time': time.perf_counter() - start_time}
+        case['calibration']['rms'] = cam_calib.rms
+        case['reprojection_error'].update({'rms': errors['rms'], 'max': errors['max']})
+
+        # Map build and steady state remapping of a frame of the case resolution
+        engine = cam_calib.undistortion_engine
+        start_time = time.perf_counter()
+        engine.configure(cam_calib.cam_mat, cam_calib.dist_coeff, width, height)
+        map_time = time.perf_counter() - start_time
+        cam_calib.newcammat = engine.newcammat
+        frame = cv2.cvtColor(views[0][0], cv2.COLOR_GRAY2BGR)
+        undistortion_times = []
+        for _ in range(self.undistortion_repeats):
+            start_time = time.perf_counter()
+            cam_calib.undistortion(frame)
+            undistortion_times.append(time.perf_counter() - start_time)
+        case['undistortion'] = timing_stats(undistortion_times)
+        case['undistortion']['map_time'] = map_time
+
+        # Keypoint undistortion of all detected corners, solved per point and looked up in the inverse distortion grid
+        points = np.concatenate([np.asarray(corners, dtype=np.float64).reshape(-1, 2) for corners in cam_calib.imgpoints])
+        point_undistorter = PointUndistorter(cam_calib.cam_mat, cam_calib.dist_coeff, cam_calib.newcammat)
+        start_time = time.perf_counter()
+        point_undistorter.undistort_points(points, use_grid=False)
+        solve_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        point_undistorter.build_grid(image_size)
+        grid_time = time.perf_counter() - start_time
+        start_time = time.perf_counter()
+        point_undistorter.undistort_points(points)
+        lookup_time = time.perf_counter() - start_time
+        grid_accuracy = point_undistorter.grid_accuracy(seed=self.seed)
+        case['point_undistortion'] = {'points': len(points), 'solve_time': solve_time, 'grid_time': grid_time, 'lookup_time': lookup_time,
+                                      'grid_step': point_undistorter.grid_step, 'grid_accuracy': grid_accuracy}
+        case['accuracy']['point_grid_max'] = grid_accuracy['max']
+
+        cam_mat = cam_calib.cam_mat
+        dist_coeff = cam_calib.dist_coeff.reshape(-1)
+        case['recovered'] = {
+            'fx': cam_mat[0, 0], 'fy': cam_mat[1, 1], 'cx': cam_mat[0, 2], 'cy': cam_mat[1, 2],
+            'dist_coeff': dist_coeff.tolist(),
+        }
+        case['ground_truth'] = {
+            'fx': true_cam_mat[0, 0], 'fy': true_cam_mat[1, 1], 'cx': true_cam_mat[0, 2], 'cy': true_cam_mat[1, 2],
+            'dist_coeff': true_dist_coeff.tolist(),
+        }
+        case['accuracy'].update({
+            'focal_error': max(abs(cam_mat[0, 0] - true_cam_mat[0, 0]) / true_cam_mat[0, 0], abs(cam_mat[1, 1] - true_cam_mat[1, 1]) / true_cam_mat[1, 1]),
+            'center_error': max(abs(cam_mat[0, 2] - true_cam_mat[0, 2]), abs(cam_mat[1, 2] - true_cam_mat[1, 2])),
+            'dist_coeff_error': np.abs(dist_coeff[:len(true_dist_coeff)] - true_dist_coeff).tolist(),
+        })
+        undistortion_errors = undistortion_errors_to_truth(cam_mat, dist_coeff, true_cam_mat, true_dist_coeff, image_size, cam_calib.imgpoints)
+        case['accuracy']['undistortion_rms'] = float(np.sqrt(np.mean(undistortion_errors ** 2)))
+        case['accuracy']['undistortion_max'] = float(undistortion_errors.max())
+
+        case['passed'] = all(case['accuracy'][name] is not None and case['accuracy'][name] <= tolerance for name, tolerance in self.tolerances.items())
+        return case
+
+def corner_errors_to_truth(corners, true_corners):
+    # Distance of every corner, findChessboardCorners may return the corners starting from the opposite end of the board
+    corners = np.asarray(corners, dtype=np.float64).reshape(-1, 2)
+    errors = np.linalg.norm(corners - true_corners, axis=1)
+    reversed_errors = np.linalg.norm(corners[::-1] - true_corners, axis=1)
+    return errors if errors.sum() <= reversed_errors.sum() else reversed_errors
+
+def undistortion_errors_to_truth(cam_mat, dist_coeff, true_cam_mat, true_dist_coeff, image_size, imgpoints=None, step: int = 16):
+    # Distances in pixels between the undistorted positions of a pixel grid under the recovered and the true camera,
+    # limited to the area covered by @imgpoints as the distortion is extrapolated outside of it
+    width, height = image_size
+    u, v = np.meshgrid(np.arange(0, width, step, dtype=np.float64), np.arange(0, height, step, dtype=np.float64))
+    if imgpoints is not None:
+        hull = cv2.convexHull(np.concatenate([np.asarray(corners, dtype=np.float32).reshape(-1, 2) for corners in imgpoints]))
+        inside = np.array([cv2.pointPolygonTest(hull, (float(x), float(y)), False) >= 0 for x, y in zip(u.ravel(), v.ravel())])
+        u, v = u.ravel()[inside], v.ravel()[inside]
+    undistorted = []
+    for K, dist in ((cam_mat, dist_coeff), (true_cam_mat, true_dist_coeff)):
+        y_distorted = (v - K[1, 2]) / K[1, 1]
+        x_distorted = (u - K[0, 2] - K[0, 1] * y_distorted) / K[0, 0]
+        x, y = undistort_normalized(x_distorted, y_distorted, dist)
+        # Both in pixels of the true camera so the errors are comparable
+        undistorted.append(np.stack([true_cam_mat[0, 0] * x, true_cam_mat[1, 1] * y], axis=-1))
+    return np.linalg.norm(undistorted[0] - undistorted[1], axis=-1)
+
+def timing_stats(samples):
+    samples = np.asarray(samples)
+    return {
+        'count': len(samples),
+        'total': float(samples.sum()),
+        'mean': float(samples.mean()),
+        'median': float(np.median(samples)),
+        'max': float(samples.max()),
+    }
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': cv2.getNumThreads(),
+    }
+
+def print_results(results):
+    print('%-10s %5s %8s %10s %10s %10s %10s %10s %10s %10s %10s %8s %8s %8s  %s' % (
+        'resolution', 'views', 'detected', 'detect ms', 'calib ms', 'reproj ms', 'maps ms', 'remap ms', 'solve ms', 'grid ms', 'lookup ms', 'rms', 'fx err', 'c err', 'result'))
+    for case in results['cases']:
+        if 'error' in case:
+            print('%-10s %5d %8d  %s' % (case['resolution'], case['views'], case['detected_views'], case['error']))
+            continue
+        print('%-10s %5d %8d %10.2f %10.2f %10.2f %10.2f %10.2f %10.3f %10.2f %10.3f %8.4f %8.5f %8.3f  %s' % (
+            case['resolution'], case['views'], case['detected_views'],
+            1000 * case['detection']['mean'], 1000 * case['calibration']['time'], 1000 * case['reprojection_error']['time'],
+            1000 * case['undistortion']['map_time'], 1000 * case['undistortion']['mean'],
+            1000 * case['point_undistortion']['solve_time'], 1000 * case['point_undistortion']['grid_time'], 1000 * case['point_undistortion']['lookup_time'],
+            case['calibration']['rms'], case['accuracy']['focal_error'], case['accuracy']['center_error'],
+            'ok' if case['passed'] else 'FAILED'))
+
+def parse_resolution(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('Resolution %s is not in the WIDTHxHEIGHT format.' % value)
+    return width, height
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark detection, calibration and undistortion on synthetic checkerboard images.')
+    parser.add_argument('-r', '--resolutions', type=parse_resolution, nargs='+', default=[(1280, 720), (1920, 1080)], help='Image sizes as WIDTHxHEIGHT.')
+    parser.add_argument('-n', '--views', type=int, nargs='+', default=[10, 20], help='Numbers of rendered views per resolution.')
+    parser.add_argument('-s', '--edge_length', type=float, default=0.108, help='Edge length of the checkerboard squares.')
+    parser.add_argument('-vs', '--vertical_squares', type=int, default=8, help='Number of inner squares vertically.')
+    parser.add_argument('-hs', '--horizontal_squares', type=int, default=6, help='Number of inner squares horizontally.')
+    parser.add_argument('-pl', '--pyramid_levels', type=int, default=0, help='Coarse-to-fine detection levels.')
+    parser.add_argument('--noise', type=float, default=2.0, help='Standard deviation of the pixel noise.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the rendered poses and noise.')
+    parser.add_argument('-o', '--output', type=str, default='', help='Write the results as JSON to this file, - for stdout.')
+    args = parser.parse_args()
+
+    benchmark = CalibrationBenchmark((args.horizontal_squares, args.vertical_squares), args.edge_length, args.noise, pyramid_levels=args.pyramid_levels, seed=args.seed)
+    results = benchmark.run(args.resolutions, args.views)
+
+    if args.output == '-':
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+        if args.output:
+            with open(args.output, 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+            print('Results written to %s' % args.output)
+
+    if not results['passed']:
+        sys.exit(-1)
@@ -0,0 +1,141 @@
+import cv2
+import hashlib
+import json
+import numpy as np
+import os
+import time
+
+from cam_store import write_archive, read_archive
+
+# Bumped whenever the detection changes in a way that makes cached corners invalid
+# 2: detection flags are applied, corners of version 1 were found without them
+DETECTION_CACHE_VERSION = 2
+# Rough size of the description of one entry in the archive header
+ENTRY_OVERHEAD_BYTES = 160
+
+def detection_key(checkerboard_size, criteria, detection_args: dict):
+    # Identifies the detector settings, corners cached under another key are never returned
+    description = json.dumps({
+        'version': DETECTION_CACHE_VERSION,
+        'opencv': cv2.__version__,
+        'checkerboard_size': [int(size) for size in checkerboard_size],
+        'criteria': [float(value) for value in criteria],
+        'detection_args': {name: value for name, value in sorted(detection_args.items())},
+    }, sort_keys=True)
+    return hashlib.blake2b(description.encode('utf-8'), digest_size=8).hexdigest()
+
+def content_hash(file_path: str):
+    file_hash = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as image_file:
+        for chunk in iter(lambda: image_file.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+'''
+Persistent cache of checkerboard detections keyed by image content and detector settings.
+Entries hold the refined corners or the fact that no board was found, together with the image size.
+The whole cache is a single archive in the cam_store format: the entry table in the header and all corners
+in one float32 array, read back through a memory map. Files whose size and modification time did not change
+are not hashed again. When the cache grows beyond @max_bytes the least recently used entries are evicted on save.
+@cache_path: Archive file, created on the first save
+@max_bytes: Size limit of the cache
+'''
+class DetectionCache:
+    def __init__(self, cache_path: str, max_bytes: int = 16 * 2 ** 20):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        # (content hash, detection key) -> [ret, image_size, corners or None, last use]
+        self.entries = {}
+        # Path -> [size, modification time, content hash]
+        self.files = {}
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            arrays, meta = read_archive(self.cache_path)
+        except (ValueError, OSError) as e:
+            print('CACHE: Could not read %s (%s), starting empty.' % (self.cache_path, e))
+            return
+
+        corners = arrays.get('corners')
+        for content, key, ret, image_size, offset, shape, last_use in meta['entries']:
+            # Corners keep the shape returned by the detection
+            entry_corners = corners[offset:offset + int(np.prod(shape)) // 2].reshape(shape) if ret else None
+            self.entries[(content, key)] = [ret, tuple(image_size), entry_corners, last_use]
+        self.files = meta['files']
+
+    def _content_hash(self, image_path):
+        stat = os.stat(image_path)
+        known = self.files.get(image_path)
+        if known is not None and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+        image_hash = content_hash(image_path)
+        self.files[image_path] = [stat.st_size, stat.st_mtime_ns, image_hash]
+        self.dirty = True
+        return image_hash
+
+    def get(self, image_path: str, key: str):
+        # (ret, corners, image_size) of a cached detection, None if the image was not detected with these settings
+        try:
+            entry = self.entries.get((self._content_hash(image_path), key))
+        except OSError:
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[3] = time.time()
+        self.dirty = True
+        # Copied out of the memory map, callers may modify their corners
+        return entry[0], np.array(entry[2]) if entry[2] is not None else None, entry[1]
+
+    def put(self, image_path: str, key: str, ret: bool, corners, image_size):
+        try:
+            image_hash = self._content_hash(image_path)
+        except OSError:
+            return
+        corners = np.array(corners, dtype=np.float32) if ret else None
+        self.entries[(image_hash, key)] = [bool(ret), tuple(int(size) for size in image_size), corners, time.time()]
+        self.dirty = True
+
+    def size_bytes(self):
+        return sum(ENTRY_OVERHEAD_BYTES + (entry[2].nbytes if entry[2] is not None else 0) for entry in self.entries.values())
+
+    def save(self):
+        if not self.dirty:
+            return
+        self._evict()
+
+        table = []
+        corner_arrays = []
+        offset = 0
+        for (image_hash, key), (ret, image_size, corners, last_use) in self.entries.items():
+            shape = list(corners.shape) if corners is not None else []
+            table.append([image_hash, key, ret, list(image_size), offset, shape, last_use])
+            if corners is not None:
+                corner_arrays.append(corners.reshape(-1, 2))
+                offset += len(corner_arrays[-1])
+        # Hashes of files that are gone or no longer referenced are dropped
+        hashes = {image_hash for image_hash, _ in self.entries}
+        files = {path: known for path, known in self.files.items() if known[2] in hashes and os.path.exists(path)}
+        corners = np.concatenate(corner_arrays) if corner_arrays else np.zeros((0, 2), np.float32)
+
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        # The memory map of the loaded corners stays valid, the archive is replaced by a rename
+        write_archive(self.cache_path, {'corners': corners}, {'entries': table, 'files': files})
+        self.dirty = False
+
+    def _evict(self):
+        size = self.size_bytes()
+        if size <= self.max_bytes:
+            return
+        for cache_key, entry in sorted(self.entries.items(), key=lambda item: item[1][3]):
+            del self.entries[cache_key]
+            size -= ENTRY_OVERHEAD_BYTES + (entry[2].nbytes if entry[2] is not None else 0)
+            if size <= self.max_bytes:
+                break
@@ -1,24 +1,121 @@
 import cv2
 import numpy as np
-import threading
 import os
 import sys
-import shutil
+import time
+import multiprocessing
+from functools import partial
+from cam_undistort import UndistortionEngine, PointUndistorter
+from cam_loader import ImageLoader
+from cam_store import CalibrationStore
+from cam_reprojection import reprojection_errors
+from cam_coverage import ViewSelector
+from cam_tracking import BoardTracker
+from cam_metrics import METRICS
+from cam_cache import detection_key
+from cam_observations import ObservationStore
+from cam_quality import frame_quality
 
-lock = threading.Lock()
+# Flags of the full resolution search, the OpenCV default
+DETECTION_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+
+# Flags used for the search on a downscaled pyramid level
+PYRAMID_DETECTION_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE + cv2.CALIB_CB_FAST_CHECK
+
+# Corners found coarse-to-fine agree with the full resolution detection within this many pixels
+PYRAMID_DETECTION_TOLERANCE = 0.5
+
+def detect_corners(gray_scale_frame, checkerboard_size, criteria, pyramid_levels: int = 0, flags: int = None):
+    # Locate the corners and refine them to sub-pixel accuracy
+    ret, corners = find_corners(gray_scale_frame, checkerboard_size, pyramid_levels, flags)
+    
+    if ret:
+        corners = refine_corners(gray_scale_frame, corners, criteria)
+    
+    return ret, corners
+
+def find_corners(gray_scale_frame, checkerboard_size, pyramid_levels: int = 0, flags: int = None):
+    '''
+    Locate the corners without the sub-pixel refinement.
+    Without @pyramid_levels the full resolution frame is searched using @flags (DETECTION_FLAGS by default).
+    With @pyramid_levels > 0 the search runs on the frame downscaled by 2^pyramid_levels using @flags
+    (PYRAMID_DETECTION_FLAGS by default), the hits are scaled back up and refined with cornerSubPix at full resolution.
+    Refined corners match the full resolution detection within PYRAMID_DETECTION_TOLERANCE pixels. Boards that are
+    too small to be resolved on the downscaled level are not found, lower the level for distant boards.
+    '''
+    start_time = time.perf_counter()
+    if pyramid_levels <= 0:
+        if flags is None:
+            flags = DETECTION_FLAGS
+        ret, corners = cv2.findChessboardCorners(gray_scale_frame, checkerboard_size, flags=flags)
+    else:
+        if flags is None:
+            flags = PYRAMID_DETECTION_FLAGS
+        
+        small_frame = gray_scale_frame
+        for _ in range(pyramid_levels):
+            small_frame = cv2.pyrDown(small_frame)
+        
+        ret, corners = cv2.findChessboardCorners(small_frame, checkerboard_size, flags=flags)
+        
+        if ret:
+            # Map the pixel centres of the downscaled level back to full resolution
+            scale = 2 ** pyramid_levels
+            corners = (corners + 0.5) * scale - 0.5
+    
+    METRICS.observe_stage('find_corners', time.perf_counter() - start_time)
+    return ret, corners
+
+def refine_corners(gray_scale_frame, corners, criteria):
+    with METRICS.timed('corner_subpix'):
+        return cv2.cornerSubPix(gray_scale_frame, corners, (11, 11), (-1, -1), criteria)
+
+def _init_detection_worker():
+    # Parallelism comes from the pool, avoid oversubscribing the cores with OpenCV threads
+    cv2.setNumThreads(1)
+
+def _detect_corners_in_image_file(image_path, checkerboard_size, criteria, detection_args):
+    # Worker of the batch detection, runs in a separate process
+    start_time = time.perf_counter()
+    gray_scale_frame = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+    
+    return _detect_corners_in_image(image_path, gray_scale_frame, checkerboard_size, criteria, detection_args, start_time)
+
+def _detect_corners_in_image(image_path, gray_scale_frame, checkerboard_size, criteria, detection_args, start_time):
+    if gray_scale_frame is None:
+        return image_path, False, None, None, time.perf_counter() - start_time
+    
+    ret, corners = detect_corners(gray_scale_frame, checkerboard_size, criteria, **detection_args)
+    
+    return image_path, ret, corners, gray_scale_frame.shape[::-1], time.perf_counter() - start_time
 
 class CameraCalibration:
-    def __init__(self, edge_length: float = 0.108, n_calib_images: int = 30, n_vertical: int = 8, n_horizontal: int = 6, save_calib: bool = False, run_with_cuda: bool = False, debug: bool = False):
+    def __init__(self, edge_length: float = 0.108, n_calib_images: int = 30, n_vertical: int = 8, n_horizontal: int = 6, save_calib: bool = False, run_with_cuda: bool = False, debug: bool = False, pyramid_levels: int = 0, detection_flags: int = None, max_views_per_bin: int = 0, track_board: bool = False, track_refresh: int = 30, calib_dir: str = '', corner_finder=None, frame_filter=None):
         self.save_calib = save_calib
         self.run_with_cuda = run_with_cuda
         self.debug = debug
         self.frame = None
         self.checkerboard_size = (n_horizontal, n_vertical)
+        self.edge_length = edge_length
         self.found_corners = False
         # Finishing criteria
         self.criteria = (cv2.TermCriteria_EPS + cv2.TERM_CRITERIA_MAX_ITER, n_calib_images, 0.001)
         self.calib_image_goal = n_calib_images
         self.image_counter = 0
+        self.image_size = None
+        # Coarse-to-fine detection settings, see detect_corners
+        self.pyramid_levels = pyramid_levels
+        self.detection_flags = detection_flags
+        # Views of already covered poses are rejected when a bin limit is given
+        self.view_selector = ViewSelector(self.checkerboard_size, max_views_per_bin=max_views_per_bin) if max_views_per_bin > 0 else None
+        # Live frames are searched around the previous detection only, see BoardTracker
+        self.board_tracker = BoardTracker(refresh_interval=track_refresh) if track_board else None
+        # Directory the calibration is saved to, calib_data next to the scripts by default
+        self.calib_dir = calib_dir
+        # Optional replacement of find_corners for live frames taking only the gray frame, e.g. DetectionProcess.find_corners
+        self.corner_finder = corner_finder
+        # Optional FrameQualityFilter skipping the search on blurred and badly exposed live frames
+        self.frame_filter = frame_filter
         # Checkerboard matrix setup
         self.objp = np.zeros((n_horizontal * n_vertical, 3), np.float32)
         self.objp[:, :2] = np.mgrid[0:n_horizontal, 0:n_vertical].T.reshape(-1, 2)
@@ -26,15 +123,9 @@ class CameraCalibration:
         # Multiply each point of checkerboard matrix by edge length
         self.objp = self.objp * edge_length
         
-        # Create arrays to store object points and image points from all calibration frames
-        self.objpoints = [] # 3D points in real world space
-        self.imgpoints = [] # 2D points in image plane
-        
-        # List of names for saving calibration files
-        self.calibration_file_names = ['cam_matrix.txt',
-                                       'dist_coeffs.txt',
-                                       'r_vecs.txt',
-                                       't_vecs.txt'] 
+        # Image points of all calibration views with the shared board model, source name, timestamp and sharpness
+        self.observations = ObservationStore(self.objp)
+        self.rejected_views = [] # (view name, reason) of views dropped by the robust calibration
         
         # Calibration matrices
         self.newcammat = None
@@ -42,7 +133,29 @@ class CameraCalibration:
         self.dist_coeff = None
         self.rvecs = None
         self.tvecs = None
+        self.rms = None
+        self.roi = None
+        
+        # Precomputed rectify maps used for undistorting the frames
+        self.undistortion_engine = UndistortionEngine(debug=debug)
+        # Keypoint undistortion, rebuilt when the calibration or the undistorted camera matrix changes
+        self.point_undistorter = None
             
+    @property
+    def objpoints(self):
+        # 3D points in real world space, (views, corners, 3)
+        return self.observations.object_points
+
+    @property
+    def imgpoints(self):
+        # 2D points in image plane, (views, corners, 2)
+        return self.observations.image_points
+
+    @property
+    def view_names(self):
+        # Source of every view, image file name or live sample number
+        return self.observations.names
+
     def find_checkerboard_corners(self, frame):
         if self.run_with_cuda:
         
@@ -57,31 +170,64 @@ class CameraCalibration:
         self.frame = cv2.drawChessboardCorners(frame, self.checkerboard_size, corners, ret)
     
     def reprojection_error(self):
-        mean_error = 0
+        # Per view and per corner errors of the last calibration, see cam_reprojection.reprojection_errors
+        if self.cam_mat is None or self.rvecs is None or len(self.imgpoints) != len(self.rvecs) or len(self.imgpoints) == 0:
+            print('REPROJECTION_ERROR: No calibration to evaluate.')
+            return None
         
-        for i in range(len(self.objpoints)):
-            imgpoints, _ = cv2.projectPoints(self.objpoints[i], self.rvecs[i], self.tvecs[i], self.cam_mat, self.dist_coeff)
-            error = cv2.norm(self.imgpoints, imgpoints, cv2.NORM_L2)/len(imgpoints)
-            mean_error += error
-            
-        print("REPROJECTION_ERROR: {}".format(mean_error/len(self.objpoints)))
+        errors = reprojection_errors(self.objp, self.imgpoints, self.rvecs, self.tvecs, self.cam_mat, self.dist_coeff)
+        
+        print('REPROJECTION_ERROR: RMS {:.4f}, mean {:.4f}, max {:.4f}, {}'.format(
+            errors['rms'], errors['mean'], errors['max'],
+            ', '.join('p{} {:.4f}'.format(percentile, value) for percentile, value in errors['percentiles'].items())))
+        if self.debug:
+            for i, view_rms in enumerate(errors['view_rms']):
+                print('View {}: RMS {:.4f}, max {:.4f}'.format(i, view_rms, errors['view_max'][i]))
+        
+        return errors
         
     def _find_checkerboard_corners(self, frame):
         
         if frame is not None:
-            # Convert to grayscale
-            gray_scale_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            # Convert to grayscale, frames from the image loader are already single channel
+            if len(frame.shape) > 2:
+                with METRICS.timed('grayscale'):
+                    gray_scale_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            else:
+                gray_scale_frame = frame
         
+            quality = None
+            if self.frame_filter is not None:
+                accepted, quality = self.frame_filter.check(gray_scale_frame)
+                if not accepted:
+                    print('Skipped frame, sharpness %.1f, contrast %.1f.' % quality)
+                    return
+            
             # Locate the corners
-            ret, corners = cv2.findChessboardCorners(gray_scale_frame, self.checkerboard_size, None)
+            start_time = time.perf_counter()
+            ret, corners = self._locate_corners(gray_scale_frame)
+            if self.frame_filter is not None:
+                self.frame_filter.record_search(time.perf_counter() - start_time, ret)
+            
+            view_key = None
+            if ret and self.view_selector is not None:
+                # Reject views of an already covered pose before paying for the refinement
+                ret, view_key = self.view_selector.check(corners, gray_scale_frame.shape[::-1])
+                if not ret:
+                    print("Found corners, pose already covered.")
+                    return
             
             # If corners are found, add object points and image points
             if ret == True:
                 # if self.debug:
                 print("Found corners.")
-                self.objpoints.append(self.objp)
-                corners2 = cv2.cornerSubPix(gray_scale_frame, corners, (11, 11), (-1, -1), self.criteria)
-                self.imgpoints.append(corners2)
+                corners2 = refine_corners(gray_scale_frame, corners, self.criteria)
+                if self.view_selector is not None:
+                    self.view_selector.add(view_key)
+                    print(self.view_selector.coverage_summary())
+                sharpness, contrast = quality if quality is not None else frame_quality(gray_scale_frame)
+                self.observations.add(corners2, 'live_%d' % self.image_counter, sharpness=sharpness, contrast=contrast)
+                self.image_size = gray_scale_frame.shape[::-1]
 
                 self.image_counter+=1
                 
@@ -94,7 +240,139 @@ class CameraCalibration:
         else:
             print('Non valid frame passed, going to the next frame.')
 
-    def get_new_cam_matrix(self, root_folder_path: str = '', width: int = 1920, height: int = 1080):
+    def _locate_corners(self, gray_scale_frame):
+        # Search the region around the previous detection when tracking, the whole frame otherwise
+        image_size = gray_scale_frame.shape[::-1]
+        region = self.board_tracker.search_region(image_size) if self.board_tracker is not None else None
+        
+        if region is not None:
+            x, y, width, height = region
+            ret, corners = self._find_corners(gray_scale_frame[y:y + height, x:x + width])
+            self._record_search(region, ret)
+            if ret:
+                # Back to full frame coordinates
+                corners = corners + np.array([x, y], dtype=corners.dtype)
+                self.board_tracker.update(corners, image_size, tracked=True)
+                return ret, corners
+            # The region may be outdated, e.g. by the frames streamed between two samples, retry the same frame in full
+        
+        ret, corners = self._find_corners(gray_scale_frame)
+        if self.board_tracker is not None:
+            self._record_search(None, ret)
+            self.board_tracker.update(corners if ret else None, image_size, tracked=False)
+        
+        return ret, corners
+
+    def _record_search(self, region, ret):
+        METRICS.increment('board_searches', region='tracked' if region is not None else 'full', result='found' if ret else 'missed')
+        if self.debug:
+            print('Searched %s, corners %s.' % ('%dx%d at %d,%d' % (region[2], region[3], region[0], region[1]) if region is not None else 'full frame', 'found' if ret else 'not found'))
+
+    def _find_corners(self, gray_scale_frame):
+        if self.corner_finder is not None:
+            return self.corner_finder(gray_scale_frame)
+        return find_corners(gray_scale_frame, self.checkerboard_size, **self.detection_args())
+
+    def detection_args(self):
+        # Keyword arguments of detect_corners, shared with the batch detection workers
+        return {'pyramid_levels': self.pyramid_levels, 'flags': self.detection_flags}
+
+    def find_checkerboard_corners_batch(self, image_paths, workers: int = None, on_result=None, detection_cache=None):
+        '''
+        Headless detection over a list of image files using a process pool, one worker per core by default.
+        Results are merged into the observations in filename order regardless of which worker finishes first.
+        With a single worker the images are detected in this process, decoded ahead by a prefetching ImageLoader.
+        @on_result: Optional callback called with (image_path, ret, corners) for every processed image
+        @detection_cache: Optional DetectionCache, only images missing from it are detected and the new results are saved to it
+        Returns list of (image_path, ret, seconds) timings.
+        '''
+        image_paths = sorted(image_paths)
+        workers = workers or os.cpu_count() or 1
+        timings = []
+        
+        start_time = time.perf_counter()
+        
+        if detection_cache is None:
+            detections = ((detection, False) for detection in self._iter_batch_detections(image_paths, workers))
+        else:
+            detections = self._iter_cached_detections(image_paths, workers, detection_cache)
+        
+        for (image_path, ret, corners, image_size, elapsed), cached in detections:
+            image_name = os.path.basename(image_path)
+            
+            if image_size is None:
+                print('%s: could not be read, skipping.' % image_name)
+            elif ret and self.image_size is not None and image_size != self.image_size:
+                print('%s: size %dx%d differs from %dx%d, skipping.' % ((image_name,) + tuple(image_size) + tuple(self.image_size)))
+                ret = False
+            elif ret:
+                self.observations.add(corners, image_name, timestamp=os.path.getmtime(image_path))
+                self.image_size = image_size
+                self.image_counter += 1
+            
+            if cached:
+                print('%s: %s corners (cached)' % (image_name, 'found' if ret else 'no'))
+            else:
+                print('%s: %s corners in %.3f s' % (image_name, 'found' if ret else 'no', elapsed))
+                # Stages inside the worker processes are not visible here, only the total per image
+                METRICS.observe_stage('detect_image', elapsed)
+            timings.append((image_path, ret, elapsed))
+            
+            if on_result is not None:
+                on_result(image_path, ret, corners)
+        
+        total_time = time.perf_counter() - start_time
+        print('Processed %d images with %d workers in %.3f s (%.3f s of detection time), found corners in %d.' %
+              (len(timings), workers, total_time, sum(timing[2] for timing in timings), sum(1 for timing in timings if timing[1])))
+        if detection_cache is not None:
+            print('Detection cache: %d cached, %d detected.' % (detection_cache.hits, detection_cache.misses))
+        
+        return timings
+
+    def _iter_cached_detections(self, image_paths, workers, detection_cache):
+        # Yields (detection, cached) in the order of @image_paths, detecting only the images missing from the cache
+        key = detection_key(self.checkerboard_size, self.criteria, self.detection_args())
+        cached_detections = {}
+        for image_path in image_paths:
+            cached_detection = detection_cache.get(image_path, key)
+            if cached_detection is not None:
+                cached_detections[image_path] = cached_detection
+            METRICS.increment('detection_cache', result='hit' if cached_detection is not None else 'miss')
+        
+        missing_paths = [image_path for image_path in image_paths if image_path not in cached_detections]
+        detections = self._iter_batch_detections(missing_paths, workers) if missing_paths else None
+        try:
+            for image_path in image_paths:
+                if image_path in cached_detections:
+                    ret, corners, image_size = cached_detections[image_path]
+                    yield (image_path, ret, corners, image_size, 0.0), True
+                    continue
+                
+                detection = next(detections)
+                _, ret, corners, image_size, _ = detection
+                # Unreadable files are detected again next time
+                if image_size is not None:
+                    detection_cache.put(image_path, key, ret, corners, image_size)
+                yield detection, False
+        finally:
+            if detections is not None:
+                detections.close()
+            detection_cache.save()
+
+    def _iter_batch_detections(self, image_paths, workers):
+        if workers == 1:
+            for image_path, gray_scale_frame in ImageLoader(image_paths, grayscale=True):
+                yield _detect_corners_in_image(image_path, gray_scale_frame, self.checkerboard_size, self.criteria, self.detection_args(), time.perf_counter())
+            return
+        
+        detect = partial(_detect_corners_in_image_file, checkerboard_size=self.checkerboard_size, criteria=self.criteria, detection_args=self.detection_args())
+        
+        # Spawned workers do not inherit the capture and streaming threads of the parent
+        with multiprocessing.get_context('spawn').Pool(processes=workers, initializer=_init_detection_worker) as pool:
+            # imap keeps the input order, so the merge is deterministic
+            yield from pool.imap(detect, image_paths)
+
+    def get_new_cam_matrix(self, root_folder_path: str = '', width: int = 1920, height: int = 1080, alpha: float = 1.0):
         if not root_folder_path:
             print('UNDISTORT: No path provided.')
             sys.exit(-1)
@@ -103,76 +381,124 @@ class CameraCalibration:
             print('UNDISTORT: Incorrect image size provided.')
             sys.exit(-1)
             
-        self.cam_mat, self.dist_coeff, self.rvecs, self.rvecs = self._load_calib(root_folder_path=root_folder_path)
+        self.cam_mat, self.dist_coeff, self.rvecs, self.tvecs = self._load_calib(root_folder_path=root_folder_path)
+        
+        if self.cam_mat is None:
+            print('UNDISTORT: No calibration found in %s.' % root_folder_path)
+            sys.exit(-1)
         
-        self.newcammat = cv2.getOptimalNewCameraMatrix(self.cam_mat, self.dist_coeff, (width, height), 1, (width, height))
+        # Rectify maps are cached next to the calibration data
+        self.undistortion_engine.cache_dir = root_folder_path
+        self.undistortion_engine.configure(self.cam_mat, self.dist_coeff, width, height, alpha)
+        self.newcammat = self.undistortion_engine.newcammat
+        self.roi = self.undistortion_engine.roi
                    
     def undistortion(self, frame):
         
         if self.cam_mat is not None and self.dist_coeff is not None and self.newcammat is not None:
-            undistorted_frame = cv2.undistort(frame, self.cam_mat, self.dist_coeff, None)
+            undistorted_frame = self.undistortion_engine.undistort(frame)
+            # Frames of a different resolution rebuild the maps and the new camera matrix
+            self.newcammat = self.undistortion_engine.newcammat
+            self.roi = self.undistortion_engine.roi
             return undistorted_frame           
         else:
             return None
         
-    def calibration(self, frame):
-        if len(frame.shape) > 2:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    def undistort_points(self, points, normalized: bool = False, use_grid: bool = True):
+        '''
+        Undistort keypoints of a distorted frame without undistorting the frame, see PointUndistorter.
+        Pixel results are in the undistorted frame returned by undistortion (camera matrix newcammat).
+        With @use_grid the points are looked up in an inverse distortion grid of the frame size, built on first use.
+        @points: (N, 2) pixel coordinates
+        @normalized: Return normalized coordinates instead of pixels
+        Returns (N, 2) coordinates, None without a calibration.
+        '''
+        if self.cam_mat is None or self.dist_coeff is None:
+            return None
+        
+        new_cam_mat = self.newcammat if self.newcammat is not None else self.cam_mat
+        image_size = self.undistortion_engine.size or self.image_size
+        point_undistorter = self.point_undistorter
+        if (point_undistorter is None or not np.array_equal(point_undistorter.cam_mat, self.cam_mat) or not np.array_equal(point_undistorter.dist_coeff, np.ravel(self.dist_coeff))
+                or not np.array_equal(point_undistorter.new_cam_mat, new_cam_mat)):
+            point_undistorter = self.point_undistorter = PointUndistorter(self.cam_mat, self.dist_coeff, new_cam_mat)
+        if use_grid and image_size is not None and point_undistorter.image_size != tuple(image_size):
+            point_undistorter.build_grid(image_size)
+        
+        return point_undistorter.undistort_points(points, normalized=normalized, use_grid=use_grid)
+
+    def calibration(self, frame=None, robust=None):
+        # @robust: Optional RobustCalibration rejecting outlier views, rejected views are moved to rejected_views
+        if frame is not None:
+            if len(frame.shape) > 2:
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            image_size = frame.shape[::-1]
+        else:
+            # Size recorded while detecting the corners
+            image_size = self.image_size
+        self.image_size = tuple(image_size) if image_size is not None else None
+        
+        if image_size is None or len(self.objpoints) == 0:
+            print('No calibration samples collected, skipping calibration.')
+            return
         
         print('Performing calibration...')
-        ret, camera_mtx, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(self.objpoints, self.imgpoints, frame.shape[::-1], None, None)
+        if robust is None:
+            ret, camera_mtx, dist_coeffs, rvecs, tvecs = cv2.calibrateCamera(self.objpoints, self.imgpoints, image_size, None, None)
+        else:
+            kept, rejected, result = robust.calibrate(self.objpoints, self.imgpoints, image_size, self.view_names)
+            if result is None:
+                print('Calibration failed.')
+                return
+            ret, camera_mtx, dist_coeffs, rvecs, tvecs = result
+            
+            self.rejected_views = [(self.view_names[index], reason) for index, reason in rejected]
+            for view_name, reason in self.rejected_views:
+                print('Rejected %s: %s' % (view_name, reason))
+            print('Kept %d of %d views.' % (len(kept), len(self.imgpoints)))
+            
+            # Keep only the views the calibration was solved with
+            self.observations.keep(kept)
         print('Calibration complete')   
+        self.rms = ret
+        self.cam_mat = camera_mtx
+        self.dist_coeff = dist_coeffs
+        self.rvecs = rvecs
+        self.tvecs = tvecs
         if self.save_calib:
             if self.debug:
                 print('Saving calibration')
-            self._save_calib(ret, camera_mtx, dist_coeffs, rvecs, tvecs)      
+            # The views are saved along with the calibration, see ObservationStore.load
+            extra_arrays, extra_meta = self.observations.arrays()
+            if robust is not None:
+                extra_meta['rejected_views'] = [list(view) for view in self.rejected_views]
+            self._save_calib(ret, camera_mtx, dist_coeffs, rvecs, tvecs, extra_meta, extra_arrays)      
 
-    def _save_calib(self, ret, cam_mat, dist_coef, rvecs, tvecs):
+    def _save_calib(self, ret, cam_mat, dist_coef, rvecs, tvecs, extra_meta=None, extra_arrays=None):
         file_dir_path = os.path.abspath(os.path.dirname(__file__))
-        calib_data_path = os.path.join(file_dir_path, 'calib_data')
-
-        if os.path.exists(calib_data_path):
-            shutil.rmtree(calib_data_path)
-        os.mkdir(calib_data_path)
+        calib_data_path = self.calib_dir or os.path.join(file_dir_path, 'calib_data')
 
-        # Remove old files of previous calibrations
-        calibration_file_paths = self.check_for_calibration_files(root_folder_path=calib_data_path, remove_file=True)
-        
-        if calibration_file_paths != None or len(calibration_file_paths) > 0:
-            print('RMS: ', ret)
-            np.savetxt(calibration_file_paths[0], cam_mat, delimiter=',')
-            np.savetxt(calibration_file_paths[1], dist_coef, delimiter=',')  
-            np.savetxt(calibration_file_paths[2], rvecs, delimiter=',') 
-            np.savetxt(calibration_file_paths[3], tvecs, delimiter=',')
-        else:
-            print('Failed to save calibration files. Check paths for saving data.')
+        # Every run is kept as its own archive, the new one becomes the latest
+        print('RMS: ', ret)
+        try:
+            archive_path = CalibrationStore(calib_data_path).save(ret, cam_mat, dist_coef, rvecs, tvecs, self.image_size, self.checkerboard_size, self.edge_length, extra_arrays=extra_arrays, extra_meta=extra_meta)
+            print('Calibration saved to %s' % archive_path)
+        except OSError as e:
+            print('Failed to save calibration files. Check paths for saving data. %s' % e)
         
     def _load_calib(self, root_folder_path: str = ''):
+        store = CalibrationStore(root_folder_path)
+        calibration = store.load()
         
-        calibration_file_paths = self.check_for_calibration_files(root_folder_path=root_folder_path)
+        if calibration is None and store.has_txt_calibration():
+            # Calibration from before the archives, can be converted with cam_store.py
+            print('Loading txt calibration from %s, convert it with: python cam_store.py %s' % (root_folder_path, root_folder_path))
+            calibration = store.load_txt()
         
-        if calibration_file_paths is not None or len(calibration_file_paths) > 0:
-            cam_mat = np.loadtxt(calibration_file_paths[0], dtype=float, delimiter=',')
-            dist_coeff = np.loadtxt(calibration_file_paths[1], dtype=float, delimiter=',')
-            rvecs = np.loadtxt(calibration_file_paths[2], dtype=float, delimiter=',')
-            tvecs = np.loadtxt(calibration_file_paths[3], dtype=float, delimiter=',')
-            return [cam_mat, dist_coeff, rvecs, tvecs]
+        if calibration is not None:
+            return [calibration['cam_mat'], calibration['dist_coeff'], calibration['rvecs'], calibration['tvecs']]
         else:
             return [None, None, None, None]
-          
-    def check_for_calibration_files(self, root_folder_path: str = '', remove_file: bool = False):
-        calibration_file_paths = []
-        
-        if not os.path.exists(root_folder_path):
-            return None
-        
-        for file in self.calibration_file_names:
-            file_path = os.path.join(root_folder_path, file)
-            if os.path.exists(file_path) and remove_file:
-                os.remove(file_path)
-            calibration_file_paths.append(file_path)
-            
-        return calibration_file_paths
     
     def finished_collecting_samples(self):
         if self.image_counter >= self.calib_image_goal:
@@ -186,7 +512,9 @@ class CameraCalibration:
         frame = None
         image_found = False
         if self.found_corners:
-            frame = self.frame.copy()
+            # Handed over without a copy, the next detection draws into a new frame
+            frame = self.frame
+            self.frame = None
             self.found_corners = False
             image_found = True
             
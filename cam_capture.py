@@ -1,70 +1,151 @@
 import cv2
 import threading
 import os
+import time
+from collections import namedtuple
+from cam_encoder import encode_jpeg
+from cam_metrics import METRICS
 
-lock = threading.Lock()
+# Captured frame with its sequence number (starting at 1) and monotonic capture timestamp in seconds
+CapturedFrame = namedtuple('CapturedFrame', ['image', 'seq', 'timestamp'])
 
 '''
 Gstreamer camera capture.
+The capture thread reads every frame into a new back buffer without holding any lock,
+only the swap of the latest frame reference is done under the lock, so readers never wait for the camera.
 @gstreamer_str: Gstreamer pipeline string for launching the camera
 @name: Variable for naming debug windows
 @debug: Flag to enable debug windows
+@frame_source: Read the frames from this source instead of the camera, see cam_source
+@max_failed_reads: Consecutive failed reads after which the capture stops, single dropped frames are retried
 '''
 class CameraCapture:
-    def __init__(self, gstreamer_str: str, name: str = '', debug=False):
+    def __init__(self, gstreamer_str: str = '', name: str = '', debug=False, frame_source=None, max_failed_reads: int = 30):
         # os.system('service nvargus-daemon restart')
         # TODO: Add name to associated frame
         self.name = name
-        self.video_capture = cv2.VideoCapture(gstreamer_str, cv2.CAP_GSTREAMER)
+        if frame_source is None:
+            frame_source = cv2.VideoCapture(gstreamer_str, cv2.CAP_GSTREAMER)
+        self.video_capture = frame_source
         # TODO: add debug windows
         self.debug = debug
+        self.max_failed_reads = max_failed_reads
         self.frame = None
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        self.running = True
+        # Guards only the latest frame reference, notified on every new frame
+        self.frame_lock = threading.Lock()
+        self.new_frame = threading.Condition(self.frame_lock)
+        # Serializes reading and releasing the source, releasing it in the middle of a read crashes the backend
+        self.source_lock = threading.Lock()
 
     def __del__(self):
         self.video_capture.release()
     
     def capturing(self):
-        while self.video_capture.isOpened():
-            with lock:
-                if self.debug:
-                    print('Capturing frame.')
-                success, self.frame = self.video_capture.read()
+        failed_reads = 0
+        while self.running and self.video_capture.isOpened():
+            if self.debug:
+                print('Capturing frame.')
+            # Blocking read happens outside the frame lock
+            with self.source_lock:
+                if not self.running:
+                    break
+                start_time = time.perf_counter()
+                success, frame = self.video_capture.read()
+            METRICS.observe_stage('capture', time.perf_counter() - start_time)
+
+            if not success or frame is None:
+                failed_reads += 1
+                METRICS.increment('frames_dropped', reason='read_failed')
+                if failed_reads >= self.max_failed_reads:
+                    # Pipeline ended or the camera failed, stop instead of spinning on failed reads
+                    print('Failed to read %d frames in a row, stopping capture.' % failed_reads)
+                    break
+                continue
+            failed_reads = 0
+
+            METRICS.increment('frames', event='captured')
+            timestamp = time.monotonic()
+            with self.new_frame:
+                self.frame = frame
+                self.frame_seq += 1
+                self.frame_timestamp = timestamp
+                self.new_frame.notify_all()
+
+        # Wake up everyone waiting for a frame that will not come
+        with self.new_frame:
+            self.running = False
+            self.new_frame.notify_all()
     
     def stop(self):
-        self.video_capture.release()
+        with self.new_frame:
+            self.running = False
+            self.new_frame.notify_all()
+        # Waits for a read in progress to finish
+        with self.source_lock:
+            self.video_capture.release()
         
     def latest_frame(self, encode: bool = False):
         # If successfully read a new frame
-        with lock:
+        with self.frame_lock:
+            frame = self.frame
+
+        if frame is None:
+            return None
+
+        if encode:
+            return self.encode_frame(frame)
+        else:
+            return frame
+    
+    def latest_captured_frame(self):
+        # Latest frame together with its sequence number and timestamp, None before the first frame
+        with self.frame_lock:
             if self.frame is None:
                 return None
-            
-            if encode:
-                return self.encode_frame(self.frame)
-            else:
-                return self.frame
-    
+            return CapturedFrame(self.frame, self.frame_seq, self.frame_timestamp)
+
+    def wait_for_frame(self, newer_than: int = 0, timeout: float = None):
+        # Block until a frame with sequence number greater than @newer_than is available.
+        # Returns None on timeout or when the capture stopped.
+        with self.new_frame:
+            if not self.new_frame.wait_for(lambda: self.frame_seq > newer_than or not self.running, timeout):
+                return None
+            if self.frame_seq <= newer_than:
+                return None
+            return CapturedFrame(self.frame, self.frame_seq, self.frame_timestamp)
+
+    def frame_age(self, captured_frame=None):
+        # Seconds since the given (or the latest) frame was captured
+        if captured_frame is None:
+            captured_frame = self.latest_captured_frame()
+        if captured_frame is None:
+            return None
+        return time.monotonic() - captured_frame.timestamp
+
     def encode_frame(self, frame):
         if frame is not None:  
-            success_encode, encoded_frame = cv2.imencode('.jpg', frame)
+            # View of the encoded buffer, None if encoding failed
+            with METRICS.timed('encode'):
+                encoded_frame = encode_jpeg(frame)
             
             if self.debug:
                 print('Encoding frame.')
             
-            if not success_encode:
-                return None
-            else:
-                return bytearray(encoded_frame)
+            return encoded_frame
             
     def load_image(self, image_path):
         return cv2.imread(image_path)
     
     def save_image(self, image_name, path_to_save_in):
+        # Only the reference is taken under the lock, capture continues while writing
+        frame = self.latest_frame()
 
-        with lock:
-            if self.frame is not None: 
-                calibration_image_path =  os.path.join(path_to_save_in, image_name)  
-                cv2.imwrite(calibration_image_path, self.frame, [cv2.IMWRITE_JPEG_OPTIMIZE , 1])
-                return True
-            else:
-                return False
\ No newline at end of file
+        if frame is not None:
+            calibration_image_path =  os.path.join(path_to_save_in, image_name)  
+            cv2.imwrite(calibration_image_path, frame, [cv2.IMWRITE_JPEG_OPTIMIZE , 1])
+            return True
+        else:
+            return False
\ No newline at end of file
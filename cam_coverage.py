@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+# Pose tilt bins, named by the board edge that is farther from the camera (shorter in the image)
+TILT_NAMES = ['frontal', 'right_far', 'left_far', 'top_far', 'bottom_far']
+
+'''
+Pose-diversity index of the collected calibration views.
+A view is described by the bin of its board centre on a grid over the frame, its scale (board size relative to the frame)
+and its tilt (which side of the board is foreshortened). Each bin accepts at most @max_views_per_bin views,
+new detections falling into a full bin are rejected. The check only needs the unrefined corners,
+so redundant views are rejected before cornerSubPix.
+@checkerboard_size: Inner corners of the board as passed to findChessboardCorners
+@grid_size: Number of (columns, rows) of the position grid
+@scale_edges: Board scale bin edges, scale is sqrt(board area / frame area)
+@tilt_threshold: Log ratio of opposite board edge lengths above which the board counts as tilted
+@max_views_per_bin: Views accepted per (position, scale, tilt) bin
+'''
+class ViewSelector:
+    def __init__(self, checkerboard_size, grid_size=(4, 3), scale_edges=(0.25, 0.45), tilt_threshold: float = 0.1, max_views_per_bin: int = 2):
+        self.checkerboard_size = tuple(checkerboard_size)
+        self.grid_size = tuple(grid_size)
+        self.scale_edges = np.asarray(scale_edges)
+        self.tilt_threshold = tilt_threshold
+        self.max_views_per_bin = max_views_per_bin
+
+        # Views per (column, row, scale, tilt) bin
+        self.bins = np.zeros(self.grid_size + (len(scale_edges) + 1, len(TILT_NAMES)), dtype=np.int32)
+        self.accepted = 0
+        self.rejected = 0
+
+    def view_key(self, corners, image_size):
+        corners = np.asarray(corners, dtype=np.float64).reshape(-1, 2)
+        # findChessboardCorners may start from the opposite end of the board, start from the corner closer to the top left
+        if corners[0].sum() > corners[-1].sum():
+            corners = corners[::-1]
+        # Corners are ordered row by row along the first checkerboard dimension
+        n_columns = self.checkerboard_size[0]
+        # Outer corners of the board in detection order: top left, top right, bottom right, bottom left
+        quad = corners[[0, n_columns - 1, len(corners) - 1, len(corners) - n_columns]]
+        width, height = image_size
+
+        centre = quad.mean(axis=0)
+        column = min(int(centre[0] / width * self.grid_size[0]), self.grid_size[0] - 1)
+        row = min(int(centre[1] / height * self.grid_size[1]), self.grid_size[1] - 1)
+
+        scale = np.sqrt(abs(cv2.contourArea(quad.astype(np.float32))) / (width * height))
+        scale_bin = int(np.searchsorted(self.scale_edges, scale))
+
+        # Foreshortened edges are shorter, compare the opposite edges of the quad
+        edges = np.linalg.norm(np.roll(quad, -1, axis=0) - quad, axis=1)
+        first_vs_third = np.log(max(edges[0], 1e-6) / max(edges[2], 1e-6))
+        second_vs_fourth = np.log(max(edges[1], 1e-6) / max(edges[3], 1e-6))
+        if max(abs(first_vs_third), abs(second_vs_fourth)) < self.tilt_threshold:
+            tilt = 0
+        elif abs(second_vs_fourth) >= abs(first_vs_third):
+            tilt = 1 if second_vs_fourth < 0 else 2
+        else:
+            tilt = 3 if first_vs_third < 0 else 4
+
+        return (max(column, 0), max(row, 0), scale_bin, tilt)
+
+    def check(self, corners, image_size):
+        # Returns (accepted, key), the view is counted only once it is added with add(key)
+        key = self.view_key(corners, image_size)
+        if self.bins[key] >= self.max_views_per_bin:
+            self.rejected += 1
+            return False, key
+        return True, key
+
+    def add(self, key):
+        self.bins[key] += 1
+        self.accepted += 1
+
+    def position_coverage(self):
+        # Views per grid cell as (rows, columns)
+        return self.bins.sum(axis=(2, 3)).T
+
+    def missing_regions(self):
+        # (column, row) cells of the grid without any view
+        counts = self.position_coverage()
+        return [(column, row) for row in range(self.grid_size[1]) for column in range(self.grid_size[0]) if counts[row, column] == 0]
+
+    def coverage_summary(self):
+        counts = self.position_coverage()
+        scales = self.bins.sum(axis=(0, 1, 3))
+        tilts = self.bins.sum(axis=(0, 1, 2))
+        lines = ['COVERAGE: %d accepted, %d rejected as redundant, %d/%d grid cells covered' % (
+            self.accepted, self.rejected, np.count_nonzero(counts), counts.size)]
+        lines += ['  ' + ' '.join('%3d' % count for count in row) for row in counts]
+        lines.append('  scales (small/medium/large): ' + '/'.join(str(count) for count in scales))
+        lines.append('  tilts: ' + ', '.join('%s %d' % (name, count) for name, count in zip(TILT_NAMES, tilts)))
+        return '\n'.join(lines)
+
+    def draw_coverage(self, frame):
+        # Outline the grid cells that still need samples
+        height, width = frame.shape[:2]
+        cell_width = width / self.grid_size[0]
+        cell_height = height / self.grid_size[1]
+        color = 255 if frame.ndim == 2 else (0, 0, 255)
+        for column, row in self.missing_regions():
+            top_left = (int(column * cell_width) + 4, int(row * cell_height) + 4)
+            bottom_right = (int((column + 1) * cell_width) - 4, int((row + 1) * cell_height) - 4)
+            cv2.rectangle(frame, top_left, bottom_right, color, 2)
+        return frame
@@ -0,0 +1,97 @@
+import cv2
+import multiprocessing
+import threading
+import time
+
+from cam_calib import find_corners
+from cam_metrics import METRICS
+from cam_shm import SharedFrameRing
+
+def _detection_process(connection, checkerboard_size, detection_args):
+    # Runs in the detection process until None is received or the connection closes
+    # Parallelism comes from one process per camera, avoid oversubscribing the cores with OpenCV threads
+    cv2.setNumThreads(1)
+    frame_ring = None
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            break
+        if request is None:
+            break
+        # The frames arrive through shared memory, the request only names the slot and a new ring after a resize
+        new_frame_ring, seq = request
+        if new_frame_ring is not None:
+            if frame_ring is not None:
+                frame_ring.close()
+            frame_ring = new_frame_ring
+        shared_frame = frame_ring.get(seq)
+        result = find_corners(shared_frame.image, checkerboard_size, **detection_args)
+        del shared_frame
+        connection.send(result)
+    if frame_ring is not None:
+        frame_ring.close()
+    connection.close()
+
+'''
+Checkerboard search in a dedicated process, so several cameras search in parallel on separate cores
+instead of sharing the interpreter of the main process.
+find_corners blocks the calling thread, without holding the GIL, until the process answers.
+The frame is copied into a SharedFrameRing and read there as a view, only its sequence number goes through the pipe.
+If the process dies the search continues in the calling process.
+@checkerboard_size: Inner corners of the board as passed to findChessboardCorners
+@detection_args: Keyword arguments of find_corners, see CameraCalibration.detection_args
+@name: Name of the process
+'''
+class DetectionProcess:
+    def __init__(self, checkerboard_size, detection_args=None, name: str = 'detection'):
+        self.checkerboard_size = tuple(checkerboard_size)
+        self.detection_args = dict(detection_args or {})
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.get_context('spawn').Process(target=_detection_process, args=(worker_connection, self.checkerboard_size, self.detection_args), name=name, daemon=True)
+        self.process.start()
+        worker_connection.close()
+        # One request at a time per process
+        self.lock = threading.Lock()
+        self.alive = True
+        # Created for the first frame, replaced when a larger frame arrives.
+        # The request/response handshake keeps the slots safe, so the ring needs no lock of its own.
+        self.frame_ring = None
+
+    def find_corners(self, gray_scale_frame):
+        # Same result as cam_calib.find_corners
+        if self.alive:
+            start_time = time.perf_counter()
+            try:
+                with self.lock:
+                    self.connection.send(self._share_frame(gray_scale_frame))
+                    result = self.connection.recv()
+                METRICS.observe_stage('find_corners_process', time.perf_counter() - start_time)
+                return result
+            except (EOFError, OSError) as e:
+                print('DETECTION: %s stopped (%s), searching in this process.' % (self.process.name, e))
+                self.alive = False
+        return find_corners(gray_scale_frame, self.checkerboard_size, **self.detection_args)
+
+    def _share_frame(self, gray_scale_frame):
+        # Request for the process, a new ring is pickled along with the first frame that needs it
+        new_frame_ring = None
+        if self.frame_ring is None or gray_scale_frame.nbytes > self.frame_ring.slot_bytes:
+            if self.frame_ring is not None:
+                self.frame_ring.close()
+            self.frame_ring = new_frame_ring = SharedFrameRing(gray_scale_frame.nbytes, n_slots=2, synchronized=False)
+        return new_frame_ring, self.frame_ring.write(gray_scale_frame)
+
+    def stop(self):
+        if self.alive:
+            try:
+                with self.lock:
+                    self.connection.send(None)
+            except OSError:
+                pass
+            self.alive = False
+        self.process.join(timeout=5)
+        self.connection.close()
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
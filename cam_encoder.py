@@ -0,0 +1,101 @@
+import cv2
+import threading
+import time
+
+from cam_metrics import METRICS
+
+# Quality used by cv2.imencode when none is given
+DEFAULT_JPEG_QUALITY = 95
+
+def encode_jpeg(image, quality: int = DEFAULT_JPEG_QUALITY):
+    # Encoded JPEG as a view of the buffer returned by OpenCV, None on failure
+    success_encode, encoded_frame = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success_encode:
+        return None
+    return encoded_frame.reshape(-1).data
+
+'''
+JPEG encoder stage running on a small pool of threads.
+Frames are submitted with their sequence number and capture timestamp
+and handed to @on_encoded(encoded_frame, image, timestamp) in sequence order.
+Only the newest submitted frame waits for a free worker, older pending frames are skipped,
+and a frame that finishes after a newer one was already delivered is dropped as stale.
+cv2.imencode releases the GIL, so the encoding runs in parallel with the processing loop.
+@on_encoded: Callback receiving the encoded frame (memoryview), the source image and the capture timestamp, e.g. CameraStream.push_frame
+@workers: Number of encoding threads
+@quality: JPEG quality
+@debug: Flag to enable debug prints
+'''
+class FrameEncoder:
+    def __init__(self, on_encoded, workers: int = 2, quality: int = DEFAULT_JPEG_QUALITY, debug: bool = False):
+        self.on_encoded = on_encoded
+        self.quality = quality
+        self.debug = debug
+        self.pending = None
+        self.submitted_seq = 0
+        self.delivered_seq = 0
+        self.encoded = 0
+        # Frames replaced while waiting for a worker and frames finished after a newer one
+        self.skipped = 0
+        self.stale = 0
+        self.running = True
+        # Guards the pending frame, delivery is serialized separately to keep the order
+        self.pending_ready = threading.Condition()
+        self.delivery_lock = threading.Lock()
+        self.threads = [threading.Thread(target=self._work, daemon=True) for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, image, seq: int = None, timestamp: float = None):
+        # Non-blocking, @seq defaults to the next number after the last submitted frame,
+        # frames with a sequence number not newer than the last submitted one are ignored.
+        # @timestamp: time.monotonic() of the capture, defaults to now
+        if image is None:
+            return
+
+        with self.pending_ready:
+            if seq is None:
+                seq = self.submitted_seq + 1
+            elif seq <= self.submitted_seq:
+                # Same or older frame than one already submitted
+                return
+            self.submitted_seq = seq
+            if self.pending is not None:
+                # Replaced before any worker got to it
+                self.skipped += 1
+                METRICS.increment('frames_dropped', reason='encoder_skipped')
+            self.pending = (seq, image, timestamp if timestamp is not None else time.monotonic())
+            self.pending_ready.notify()
+
+    def stop(self):
+        with self.pending_ready:
+            self.running = False
+            self.pending_ready.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+    def _work(self):
+        while True:
+            with self.pending_ready:
+                self.pending_ready.wait_for(lambda: self.pending is not None or not self.running)
+                if not self.running:
+                    return
+                seq, image, timestamp = self.pending
+                self.pending = None
+
+            with METRICS.timed('encode'):
+                encoded_frame = encode_jpeg(image, self.quality)
+
+            if self.debug:
+                print('Encoded frame %d.' % seq)
+
+            with self.delivery_lock:
+                if encoded_frame is None or seq <= self.delivered_seq:
+                    # A newer frame was delivered while this one was encoding
+                    self.stale += 1
+                    METRICS.increment('frames_dropped', reason='encoder_stale')
+                    continue
+                self.delivered_seq = seq
+                self.encoded += 1
+                METRICS.increment('frames', event='encoded')
+                self.on_encoded(encoded_frame, image, timestamp)
@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+import threading
+
+'''
+Incremental calibration running next to the live collection.
+Every time new views are collected, the calibration is solved again on a background thread,
+warm-started from the previous intrinsics. The running RMS and standard deviations of the intrinsics are published
+and the collection can stop as soon as the estimates converged.
+@cam_calib: CameraCalibration collecting the views
+@min_views: Number of views before the first solve
+@max_focal_std: Converged once the standard deviation of fx and fy is below this fraction of the focal length
+@max_center_std: Converged once the standard deviation of cx and cy is below this many pixels
+@max_rms_change: Converged once the RMS changed less than this many pixels since the previous solve
+@debug: Flag to enable debug prints
+'''
+class IncrementalCalibrator:
+    def __init__(self, cam_calib, min_views: int = 10, max_focal_std: float = 0.005, max_center_std: float = 2.0, max_rms_change: float = 0.02, debug: bool = False):
+        self.cam_calib = cam_calib
+        self.min_views = max(min_views, 4)
+        self.max_focal_std = max_focal_std
+        self.max_center_std = max_center_std
+        self.max_rms_change = max_rms_change
+        self.debug = debug
+
+        # Published estimates, replaced as a whole after every solve
+        self.n_views = 0
+        self.rms = None
+        self.cam_mat = None
+        self.dist_coeff = None
+        # Standard deviations of fx, fy, cx, cy
+        self.std_intrinsics = None
+        self.converged = False
+        self.solves = 0
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _work(self):
+        while not self.stop_event.wait(0.1):
+            # Views appended while solving are not part of the snapshot
+            objpoints, imgpoints, _ = self.cam_calib.observations.snapshot()
+            n_views = len(imgpoints)
+            if n_views < self.min_views or n_views == self.n_views or self.cam_calib.image_size is None:
+                continue
+
+            try:
+                self._solve(objpoints, imgpoints, self.cam_calib.image_size)
+            except cv2.error as e:
+                print('INCREMENTAL: Calibration failed with %d views. %s' % (n_views, e))
+            self.n_views = n_views
+
+    def _solve(self, objpoints, imgpoints, image_size):
+        flags = 0
+        cam_mat = None
+        dist_coeff = None
+        if self.cam_mat is not None:
+            # Warm start from the previous estimate
+            flags = cv2.CALIB_USE_INTRINSIC_GUESS
+            cam_mat = self.cam_mat.copy()
+            dist_coeff = self.dist_coeff.copy()
+
+        rms, cam_mat, dist_coeff, _, _, std_intrinsics, _, _ = cv2.calibrateCameraExtended(
+            objpoints, imgpoints, tuple(image_size), cam_mat, dist_coeff, flags=flags)
+
+        previous_rms = self.rms
+        std_intrinsics = std_intrinsics.reshape(-1)[:4]
+        self.cam_mat, self.dist_coeff = cam_mat, dist_coeff
+        self.std_intrinsics = std_intrinsics
+        self.rms = rms
+        self.solves += 1
+
+        focal_std = max(std_intrinsics[0] / cam_mat[0, 0], std_intrinsics[1] / cam_mat[1, 1])
+        center_std = max(std_intrinsics[2], std_intrinsics[3])
+        rms_change = abs(rms - previous_rms) if previous_rms is not None else np.inf
+        self.converged = focal_std < self.max_focal_std and center_std < self.max_center_std and rms_change < self.max_rms_change
+
+        print('INCREMENTAL: %d views, RMS %.4f, fx %.1f +- %.2f, fy %.1f +- %.2f, cx %.1f +- %.2f, cy %.1f +- %.2f%s' % (
+            len(imgpoints), rms,
+            cam_mat[0, 0], std_intrinsics[0], cam_mat[1, 1], std_intrinsics[1],
+            cam_mat[0, 2], std_intrinsics[2], cam_mat[1, 2], std_intrinsics[3],
+            ', converged' if self.converged else ''))
@@ -0,0 +1,65 @@
+import cv2
+import os
+import threading
+from queue import Queue, Full
+
+def list_images(image_directory: str, image_extensions):
+    # Only files with a known image extension, sorted by filename
+    return sorted(os.path.join(image_directory, image) for image in os.listdir(image_directory)
+                  if os.path.splitext(image)[1].lower() in image_extensions)
+
+'''
+Streaming image loader.
+Images are decoded on a background thread and handed over through a bounded queue,
+so decoding overlaps the processing and at most @prefetch decoded images are held at once.
+@image_paths: Paths of the images to load, loaded in the given order
+@prefetch: Number of decoded images buffered ahead of the consumer
+@grayscale: Decode straight to single channel grayscale
+'''
+class ImageLoader:
+    def __init__(self, image_paths, prefetch: int = 4, grayscale: bool = True):
+        self.image_paths = list(image_paths)
+        self.prefetch = max(1, prefetch)
+        self.read_flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def __iter__(self):
+        image_q = Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+        decode_thread = threading.Thread(target=self._decode, args=(image_q, stop_event), daemon=True)
+        decode_thread.start()
+
+        try:
+            while True:
+                item = image_q.get()
+                if item is None:
+                    break
+                # Yields (image_path, image), image is None if the file could not be decoded
+                yield item
+        finally:
+            # Consumer stopped early, release the decoding thread
+            stop_event.set()
+            while not image_q.empty():
+                image_q.get_nowait()
+            decode_thread.join()
+
+    def _decode(self, image_q, stop_event):
+        for image_path in self.image_paths:
+            if stop_event.is_set():
+                return
+            image = cv2.imread(image_path, self.read_flag)
+            if not self._put(image_q, stop_event, (image_path, image)):
+                return
+        self._put(image_q, stop_event, None)
+
+    def _put(self, image_q, stop_event, item):
+        # Blocks while the queue is full, giving up once the consumer has stopped
+        while not stop_event.is_set():
+            try:
+                image_q.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
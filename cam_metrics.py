@@ -0,0 +1,189 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets, from 50 us to 10 s
+LATENCY_BUCKETS = [0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+'''
+Fixed bucket histogram, an observation is one bisect and a few increments.
+@buckets: Sorted upper bounds of the buckets, observations above the last one only count in +Inf
+'''
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float):
+        # Upper bound of the bucket holding the quantile, the largest observation for the +Inf bucket
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+'''
+Process wide registry of the pipeline metrics.
+Histograms and counters are created on first use and identified by name and labels,
+all updates go through a single lock, which is cheap compared to the stages being measured.
+@prefix: Prefix of the metric names in the Prometheus output
+'''
+class MetricsRegistry:
+    def __init__(self, prefix: str = 'cam'):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.descriptions = {}
+        self.started = time.monotonic()
+
+    def describe(self, name: str, description: str):
+        self.descriptions[name] = description
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def observe_stage(self, stage: str, seconds: float):
+        # Duration of one pipeline stage
+        self.observe('stage_seconds', seconds, stage=stage)
+
+    def increment(self, name: str, amount: int = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def timed(self, stage: str):
+        # Context manager timing a block as a pipeline stage
+        return _StageTimer(self, stage)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+            self.started = time.monotonic()
+
+    def prometheus(self, gauges=None):
+        # Prometheus text exposition format, @gauges: optional {name: value} of values sampled by the caller
+        with self.lock:
+            histograms = {key: (list(histogram.counts), histogram.sum, histogram.count, histogram.buckets) for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines += self._header(name + '_total', 'counter')
+            for (counter_name, labels), value in sorted(counters.items()):
+                if counter_name == name:
+                    lines.append('%s_%s_total%s %d' % (self.prefix, name, _format_labels(labels), value))
+
+        for name in sorted({name for name, _ in histograms}):
+            lines += self._header(name, 'histogram')
+            for (histogram_name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append('%s_%s_bucket%s %d' % (self.prefix, name, _format_labels(labels + (('le', bound),)), cumulative))
+                lines.append('%s_%s_sum%s %.9f' % (self.prefix, name, _format_labels(labels), total))
+                lines.append('%s_%s_count%s %d' % (self.prefix, name, _format_labels(labels), count))
+
+        for name, value in sorted((gauges or {}).items()):
+            lines += self._header(name, 'gauge')
+            lines.append('%s_%s %s' % (self.prefix, name, value))
+
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, name, metric_type):
+        lines = []
+        description = self.descriptions.get(name)
+        if description:
+            lines.append('# HELP %s_%s %s' % (self.prefix, name, description))
+        lines.append('# TYPE %s_%s %s' % (self.prefix, name, metric_type))
+        return lines
+
+    def summary(self):
+        # Human readable summary of the latencies and counters
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        lines = ['METRICS: %.0f s' % elapsed]
+        for (name, labels), histogram in histograms:
+            lines.append('  %-40s n %7d, mean %8.2f ms, p50 <= %8.2f ms, p99 <= %8.2f ms, max %8.2f ms' % (
+                name + _format_labels(labels), histogram.count, 1000 * histogram.sum / max(histogram.count, 1),
+                1000 * histogram.quantile(0.5), 1000 * histogram.quantile(0.99), 1000 * histogram.max))
+        for (name, labels), value in counters:
+            lines.append('  %-40s %d (%.1f/s)' % (name + _format_labels(labels), value, value / max(elapsed, 1e-9)))
+        return '\n'.join(lines)
+
+class _StageTimer:
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+'''
+Prints the metrics summary every @interval seconds on a background thread.
+@registry: Registry to summarize
+@interval: Seconds between the summaries
+'''
+class MetricsReporter:
+    def __init__(self, registry, interval: float = 10.0):
+        self.registry = registry
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _work(self):
+        while not self.stop_event.wait(self.interval):
+            print(self.registry.summary())
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('%s="%s"' % (name, value) for name, value in labels) + '}'
+
+# Registry shared by all pipeline stages of the process
+METRICS = MetricsRegistry()
+METRICS.describe('stage_seconds', 'Duration of the pipeline stages in seconds.')
+METRICS.describe('frame_age_seconds', 'Seconds between the capture of a frame and the point given by the label.')
+METRICS.describe('frames_total', 'Frames passing the pipeline events.')
+METRICS.describe('frames_dropped_total', 'Frames dropped, by reason.')
+METRICS.describe('board_searches_total', 'Live checkerboard searches, by searched region and result.')
+METRICS.describe('prefilter_total', 'Live frames checked by the blur and contrast prefilter, by result.')
+METRICS.describe('prefilter_saved_seconds', 'Estimated checkerboard search time saved per skipped frame.')
+METRICS.describe('detection_cache_total', 'Pre-recorded images looked up in the detection cache, by result.')
@@ -0,0 +1,123 @@
+import numpy as np
+import threading
+import time
+
+from cam_store import write_archive, read_archive
+
+'''
+Array backed store of the collected calibration views.
+The corners of all views live in one contiguous float32 block of shape (views, corners, 2) that doubles its capacity
+when full, every view shares the single board model. Per view the source name, a timestamp,
+the sharpness and the contrast of the frame (see cam_quality.frame_quality) are kept.
+image_points and object_points are passed to cv2.calibrateCamera as they are, without building lists per call.
+Views are only appended or compacted in place, so memory follows the number of views and not the session length.
+The store is saved as a single archive in the cam_store format, calibration archives embed the same arrays.
+@board_points: (corners, 3) board model shared by every view
+@capacity: Initial number of views the block holds
+'''
+class ObservationStore:
+    def __init__(self, board_points, capacity: int = 32):
+        self.board_points = np.ascontiguousarray(board_points, dtype=np.float32).reshape(-1, 3)
+        self.n_corners = len(self.board_points)
+        self.corners = np.empty((max(1, capacity), self.n_corners, 2), np.float32)
+        self.timestamps = np.empty(len(self.corners), np.float64)
+        self.sharpness = np.empty(len(self.corners), np.float32)
+        self.contrast = np.empty(len(self.corners), np.float32)
+        self.names = []
+        self.count = 0
+        # Appending and compacting may run while another thread takes a snapshot
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def add(self, corners, name: str, timestamp: float = None, sharpness: float = float('nan'), contrast: float = float('nan')):
+        # Appends a view, @corners: anything reshapeable to (corners, 2). Returns the index of the view.
+        corners = np.asarray(corners, dtype=np.float32).reshape(-1, 2)
+        if len(corners) != self.n_corners:
+            raise ValueError('View %s has %d corners, the board has %d.' % (name, len(corners), self.n_corners))
+        with self.lock:
+            if self.count == len(self.corners):
+                self._grow(2 * len(self.corners))
+            index = self.count
+            self.corners[index] = corners
+            self.timestamps[index] = time.time() if timestamp is None else timestamp
+            self.sharpness[index] = sharpness
+            self.contrast[index] = contrast
+            self.names.append(name)
+            self.count += 1
+        return index
+
+    def _grow(self, capacity):
+        # Views taken before keep referencing the previous block, which is never written again
+        for attribute in ('corners', 'timestamps', 'sharpness', 'contrast'):
+            old = getattr(self, attribute)
+            new = np.empty((capacity,) + old.shape[1:], old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, attribute, new)
+
+    @property
+    def image_points(self):
+        # (views, corners, 2) view of the stored corners
+        return self.corners[:self.count]
+
+    @property
+    def object_points(self):
+        # (views, corners, 3) read-only broadcast of the board model, no memory per view
+        return np.broadcast_to(self.board_points, (self.count,) + self.board_points.shape)
+
+    def snapshot(self):
+        # Consistent (object_points, image_points, names) of the views stored so far, safe against concurrent appends
+        with self.lock:
+            count = self.count
+            return np.broadcast_to(self.board_points, (count,) + self.board_points.shape), self.corners[:count], self.names[:count]
+
+    def keep(self, indices):
+        # Compacts the store to the given views, in the given order
+        indices = np.asarray(indices, dtype=np.intp)
+        with self.lock:
+            count = len(indices)
+            self.corners[:count] = self.corners[indices]
+            self.timestamps[:count] = self.timestamps[indices]
+            self.sharpness[:count] = self.sharpness[indices]
+            self.contrast[:count] = self.contrast[indices]
+            self.names = [self.names[index] for index in indices]
+            self.count = count
+
+    def clear(self):
+        with self.lock:
+            self.names = []
+            self.count = 0
+
+    def arrays(self):
+        # Arrays and metadata as stored in an archive, also embedded in the calibration archives
+        with self.lock:
+            arrays = {
+                'image_points': self.corners[:self.count].copy(),
+                'board_points': self.board_points,
+                'view_timestamps': self.timestamps[:self.count].copy(),
+                'view_sharpness': self.sharpness[:self.count].copy(),
+                'view_contrast': self.contrast[:self.count].copy(),
+            }
+            return arrays, {'view_names': list(self.names)}
+
+    def save(self, path: str):
+        arrays, meta = self.arrays()
+        write_archive(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path: str):
+        # Store saved with save() or views embedded in a calibration archive
+        arrays, meta = read_archive(path)
+        if 'image_points' not in arrays:
+            raise ValueError('%s holds no calibration views.' % path)
+        image_points = arrays['image_points']
+        store = cls(arrays['board_points'], capacity=len(image_points))
+        store.corners[:len(image_points)] = image_points
+        store.timestamps[:len(image_points)] = arrays['view_timestamps']
+        store.sharpness[:len(image_points)] = arrays['view_sharpness']
+        # Not saved by archives written before the contrast was recorded
+        store.contrast[:len(image_points)] = arrays['view_contrast'] if 'view_contrast' in arrays else np.nan
+        store.names = list(meta.get('view_names', [str(index) for index in range(len(image_points))]))
+        store.count = len(image_points)
+        return store
@@ -0,0 +1,78 @@
+import cv2
+
+from cam_metrics import METRICS
+
+def frame_quality(gray_scale_frame, downscale: int = 4):
+    '''
+    Sharpness and contrast of a frame, measured on a copy downscaled by @downscale.
+    Sharpness is the variance of the Laplacian, motion blur and defocus lower it.
+    Contrast is the standard deviation of the intensities, under- and overexposed frames have little of it.
+    Returns (sharpness, contrast).
+    '''
+    height, width = gray_scale_frame.shape[:2]
+    if downscale > 1:
+        gray_scale_frame = cv2.resize(gray_scale_frame, (max(width // downscale, 1), max(height // downscale, 1)), interpolation=cv2.INTER_AREA)
+    _, contrast = cv2.meanStdDev(gray_scale_frame)
+    _, sharpness = cv2.meanStdDev(cv2.Laplacian(gray_scale_frame, cv2.CV_16S))
+    return float(sharpness[0, 0] ** 2), float(contrast[0, 0])
+
+'''
+Prefilter of live frames in front of the checkerboard search.
+Frames scoring below @min_sharpness or @min_contrast, see frame_quality, are not searched at all:
+the search would mostly fail on them and blurred corners that are found degrade the calibration.
+The time saved is estimated from the average duration of the searches that ran and found no board,
+skipped frames would mostly have failed and a failing search is much slower than a successful one.
+@min_sharpness: Lowest accepted Laplacian variance of the downscaled frame (0 - no limit)
+@min_contrast: Lowest accepted intensity standard deviation (0 - no limit)
+@downscale: Downscaling factor of the frame before scoring
+'''
+class FrameQualityFilter:
+    def __init__(self, min_sharpness: float = 0.0, min_contrast: float = 0.0, downscale: int = 4):
+        self.min_sharpness = min_sharpness
+        self.min_contrast = min_contrast
+        self.downscale = downscale
+        self.accepted = 0
+        self.skipped_blurred = 0
+        self.skipped_low_contrast = 0
+        self.saved_seconds = 0.0
+        # Running mean duration of all searches and of the searches without a board
+        self.search_seconds = 0.0
+        self.searches = 0
+        self.failed_search_seconds = 0.0
+        self.failed_searches = 0
+
+    def check(self, gray_scale_frame):
+        # Returns (accepted, (sharpness, contrast))
+        with METRICS.timed('prefilter'):
+            sharpness, contrast = frame_quality(gray_scale_frame, self.downscale)
+
+        if contrast < self.min_contrast:
+            reason = 'low_contrast'
+            self.skipped_low_contrast += 1
+        elif sharpness < self.min_sharpness:
+            reason = 'blurred'
+            self.skipped_blurred += 1
+        else:
+            self.accepted += 1
+            METRICS.increment('prefilter', result='accepted')
+            return True, (sharpness, contrast)
+
+        METRICS.increment('prefilter', result=reason)
+        saved_seconds = self.failed_search_seconds if self.failed_searches > 0 else self.search_seconds
+        if saved_seconds > 0:
+            self.saved_seconds += saved_seconds
+            # The sum of the histogram is the total search time saved
+            METRICS.observe('prefilter_saved_seconds', saved_seconds)
+        return False, (sharpness, contrast)
+
+    def record_search(self, seconds: float, found: bool):
+        # Duration of a search on an accepted frame
+        self.searches += 1
+        self.search_seconds += (seconds - self.search_seconds) / self.searches
+        if not found:
+            self.failed_searches += 1
+            self.failed_search_seconds += (seconds - self.failed_search_seconds) / self.failed_searches
+
+    def summary(self):
+        return 'PREFILTER: %d accepted, %d blurred, %d low contrast skipped, %.2f s of search saved' % (
+            self.accepted, self.skipped_blurred, self.skipped_low_contrast, self.saved_seconds)
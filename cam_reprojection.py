@@ -0,0 +1,113 @@
+import cv2
+import numpy as np
+
+# Percentiles reported in the summary of the reprojection errors
+ERROR_PERCENTILES = (50, 90, 95, 99)
+
+def rotation_matrices(rvecs):
+    # Rodrigues rotation vectors (views, 3) to rotation matrices (views, 3, 3)
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    # Axis is irrelevant for zero rotation, avoid dividing by zero
+    axis = rvecs / np.where(theta > 1e-12, theta, 1.0)[:, None]
+
+    cross = np.zeros((len(rvecs), 3, 3))
+    cross[:, 0, 1] = -axis[:, 2]
+    cross[:, 0, 2] = axis[:, 1]
+    cross[:, 1, 0] = axis[:, 2]
+    cross[:, 1, 2] = -axis[:, 0]
+    cross[:, 2, 0] = -axis[:, 1]
+    cross[:, 2, 1] = axis[:, 0]
+
+    cos_theta = np.cos(theta)[:, None, None]
+    sin_theta = np.sin(theta)[:, None, None]
+    outer = axis[:, :, None] * axis[:, None, :]
+    return cos_theta * np.eye(3) + (1 - cos_theta) * outer + sin_theta * cross
+
+def distort_normalized(x, y, dist_coeff):
+    # OpenCV distortion model with up to 12 coefficients (k1, k2, p1, p2, k3, k4, k5, k6, s1, s2, s3, s4)
+    k = np.zeros(12)
+    k[:len(dist_coeff)] = dist_coeff
+    r2 = x * x + y * y
+    r4 = r2 * r2
+    r6 = r4 * r2
+    radial = (1 + k[0] * r2 + k[1] * r4 + k[4] * r6) / (1 + k[5] * r2 + k[6] * r4 + k[7] * r6)
+    x_distorted = x * radial + 2 * k[2] * x * y + k[3] * (r2 + 2 * x * x) + k[8] * r2 + k[9] * r4
+    y_distorted = y * radial + k[2] * (r2 + 2 * y * y) + 2 * k[3] * x * y + k[10] * r2 + k[11] * r4
+    return x_distorted, y_distorted
+
+def undistort_normalized(x_distorted, y_distorted, dist_coeff, iterations: int = 20):
+    # Inverse of distort_normalized by fixed-point iteration, the same scheme cv2.undistortPoints uses
+    k = np.zeros(12)
+    k[:len(dist_coeff)] = dist_coeff
+    x = np.array(x_distorted, dtype=np.float64)
+    y = np.array(y_distorted, dtype=np.float64)
+    for _ in range(iterations):
+        r2 = x * x + y * y
+        r4 = r2 * r2
+        r6 = r4 * r2
+        inverse_radial = (1 + k[5] * r2 + k[6] * r4 + k[7] * r6) / (1 + k[0] * r2 + k[1] * r4 + k[4] * r6)
+        delta_x = 2 * k[2] * x * y + k[3] * (r2 + 2 * x * x) + k[8] * r2 + k[9] * r4
+        delta_y = k[2] * (r2 + 2 * y * y) + 2 * k[3] * x * y + k[10] * r2 + k[11] * r4
+        x = (x_distorted - delta_x) * inverse_radial
+        y = (y_distorted - delta_y) * inverse_radial
+    return x, y
+
+def project_points(objpoints, rvecs, tvecs, cam_mat, dist_coeff):
+    '''
+    Project the board points of all views in one pass.
+    @objpoints: (views, corners, 3) or (corners, 3) board points shared by every view
+    @rvecs, @tvecs: Per view extrinsics, anything reshapeable to (views, 3)
+    Returns (views, corners, 2) pixel coordinates, same as cv2.projectPoints called per view.
+    '''
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    tvecs = np.asarray(tvecs, dtype=np.float64).reshape(-1, 3)
+    objpoints = np.asarray(objpoints, dtype=np.float64)
+    if objpoints.ndim == 2:
+        objpoints = np.broadcast_to(objpoints, (len(rvecs),) + objpoints.shape)
+    cam_mat = np.asarray(cam_mat, dtype=np.float64).reshape(3, 3)
+    dist_coeff = np.asarray(dist_coeff, dtype=np.float64).reshape(-1)
+
+    if len(dist_coeff) > 12:
+        # Tilted sensor model is not vectorized, fall back to OpenCV per view
+        return np.stack([cv2.projectPoints(objpoints[i], rvecs[i], tvecs[i], cam_mat, dist_coeff)[0].reshape(-1, 2) for i in range(len(rvecs))])
+
+    camera_points = np.einsum('vij,vnj->vni', rotation_matrices(rvecs), objpoints) + tvecs[:, None, :]
+    x = camera_points[..., 0] / camera_points[..., 2]
+    y = camera_points[..., 1] / camera_points[..., 2]
+    x, y = distort_normalized(x, y, dist_coeff)
+
+    u = cam_mat[0, 0] * x + cam_mat[0, 1] * y + cam_mat[0, 2]
+    v = cam_mat[1, 1] * y + cam_mat[1, 2]
+    return np.stack([u, v], axis=-1)
+
+def reprojection_errors(objpoints, imgpoints, rvecs, tvecs, cam_mat, dist_coeff):
+    '''
+    Score a calibration on its views.
+    Returns a dictionary with:
+    residuals - (views, corners, 2) detected minus projected corner positions
+    corner_errors - (views, corners) euclidean error of every corner
+    view_rms - (views,) RMS error of every view
+    view_max - (views,) largest corner error of every view
+    rms - RMS over all corners, comparable to the RMS returned by cv2.calibrateCamera
+    mean, max - mean and largest corner error
+    percentiles - {percentile: corner error} for ERROR_PERCENTILES
+    '''
+    imgpoints = np.asarray(imgpoints, dtype=np.float64)
+    imgpoints = imgpoints.reshape(len(imgpoints), -1, 2)
+    projected = project_points(objpoints, rvecs, tvecs, cam_mat, dist_coeff)
+
+    residuals = imgpoints - projected
+    squared_errors = np.sum(residuals * residuals, axis=-1)
+    corner_errors = np.sqrt(squared_errors)
+
+    return {
+        'residuals': residuals,
+        'corner_errors': corner_errors,
+        'view_rms': np.sqrt(squared_errors.mean(axis=1)),
+        'view_max': corner_errors.max(axis=1),
+        'rms': float(np.sqrt(squared_errors.mean())),
+        'mean': float(corner_errors.mean()),
+        'max': float(corner_errors.max()),
+        'percentiles': {percentile: float(value) for percentile, value in zip(ERROR_PERCENTILES, np.percentile(corner_errors, ERROR_PERCENTILES))},
+    }
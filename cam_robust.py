@@ -0,0 +1,98 @@
+import cv2
+import numpy as np
+import os
+import multiprocessing
+
+from cam_reprojection import reprojection_errors
+from cam_calib import _init_detection_worker
+
+def _solve_subset(task):
+    # Worker solving the calibration on a subset of the views, runs in a separate process
+    dropped, objpoints, imgpoints, image_size = task
+    try:
+        rms, cam_mat, dist_coeff, rvecs, tvecs = cv2.calibrateCamera(objpoints, imgpoints, image_size, None, None)
+    except cv2.error:
+        return dropped, None
+    return dropped, (rms, cam_mat, dist_coeff, rvecs, tvecs)
+
+'''
+Calibration with iterative rejection of outlier views.
+The calibration is solved, every view is scored by its reprojection RMS and the views above the threshold become
+candidates for removal. The subsets without each single candidate and without all of them are solved in parallel,
+the subset with the lowest RMS is kept and the process repeats until no view is above the threshold,
+removing views no longer improves the RMS or only @min_views views are left.
+A view is a candidate when its RMS is above both @max_view_rms pixels and @outlier_factor times the median view RMS.
+@workers: Number of worker processes, one per core by default
+'''
+class RobustCalibration:
+    def __init__(self, max_view_rms: float = 1.0, outlier_factor: float = 2.5, max_iterations: int = 10, min_views: int = 5, workers: int = None, debug: bool = False):
+        self.max_view_rms = max_view_rms
+        self.outlier_factor = outlier_factor
+        self.max_iterations = max_iterations
+        self.min_views = min_views
+        self.workers = workers or os.cpu_count() or 1
+        self.debug = debug
+
+    def calibrate(self, objpoints, imgpoints, image_size, view_names=None):
+        '''
+        Returns (kept, rejected, result) where kept are the indices of the views used by the final calibration,
+        rejected is a list of (index, reason) and result is (rms, cam_mat, dist_coeff, rvecs, tvecs) of the kept views.
+        '''
+        image_size = tuple(image_size)
+        # (views, corners, 3) and (views, corners, 2) blocks, subsets are taken by indexing instead of rebuilding lists
+        objpoints = np.asarray(objpoints, dtype=np.float32).reshape(len(imgpoints), -1, 3)
+        imgpoints = np.asarray(imgpoints, dtype=np.float32).reshape(len(imgpoints), -1, 2)
+        kept = list(range(len(imgpoints)))
+        rejected = []
+        if view_names is None:
+            view_names = [str(i) for i in kept]
+
+        result = _solve_subset(((), objpoints, imgpoints, image_size))[1]
+        if result is None:
+            return kept, rejected, None
+
+        # Workers are only started once there are outlier candidates, a clean calibration never pays for them
+        pool = None
+        try:
+            for _ in range(self.max_iterations):
+                rms, cam_mat, dist_coeff, rvecs, tvecs = result
+                view_rms = reprojection_errors(objpoints[kept[0]], imgpoints[kept], rvecs, tvecs, cam_mat, dist_coeff)['view_rms']
+                threshold = max(self.max_view_rms, self.outlier_factor * float(np.median(view_rms)))
+
+                # Worst views first, never below the minimal number of views
+                order = np.argsort(view_rms)[::-1]
+                candidates = [kept[k] for k in order if view_rms[k] > threshold][:max(len(kept) - self.min_views, 0)]
+                if not candidates:
+                    break
+                if pool is None:
+                    pool = multiprocessing.get_context('spawn').Pool(processes=self.workers, initializer=_init_detection_worker)
+
+                subsets = [(candidate,) for candidate in candidates]
+                if len(candidates) > 1:
+                    subsets.append(tuple(candidates))
+                tasks = []
+                for dropped in subsets:
+                    subset = [i for i in kept if i not in dropped]
+                    tasks.append((dropped, objpoints[subset], imgpoints[subset], image_size))
+
+                best_dropped, best_result = None, None
+                for dropped, subset_result in pool.imap(_solve_subset, tasks):
+                    if subset_result is not None and (best_result is None or subset_result[0] < best_result[0]):
+                        best_dropped, best_result = dropped, subset_result
+
+                if best_result is None or best_result[0] >= rms:
+                    break
+
+                view_rms_by_index = dict(zip(kept, view_rms))
+                for index in best_dropped:
+                    reason = 'view RMS %.3f px above threshold %.3f px, overall RMS %.3f -> %.3f px' % (view_rms_by_index[index], threshold, rms, best_result[0])
+                    rejected.append((index, reason))
+                    if self.debug:
+                        print('ROBUST: Rejected %s, %s' % (view_names[index], reason))
+                kept = [i for i in kept if i not in best_dropped]
+                result = best_result
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        return kept, rejected, result
@@ -0,0 +1,50 @@
+import threading
+import time
+
+from cam_metrics import METRICS
+
+'''
+Event driven frame loop over a CameraCapture.
+Iterating sleeps until the capture publishes a new frame and yields every frame at most once.
+Frames published while the previous one was being processed are skipped, only the newest is processed.
+Iteration ends when the capture stops or stop() is called.
+@cam_cap: CameraCapture publishing the frames
+@min_sample_interval: Seconds required between accepted calibration samples, see sample_due (0 - no limit)
+@poll_interval: Longest wait for a frame before checking for stop()
+'''
+class FrameScheduler:
+    def __init__(self, cam_cap, min_sample_interval: float = 0.0, poll_interval: float = 0.2):
+        self.cam_cap = cam_cap
+        self.min_sample_interval = min_sample_interval
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+        self.last_sample_time = None
+        self.processed = 0
+        # Frames published while the previous frame was processed
+        self.skipped = 0
+        self.stop_event = threading.Event()
+
+    def __iter__(self):
+        while not self.stop_event.is_set():
+            captured_frame = self.cam_cap.wait_for_frame(self.last_seq, self.poll_interval)
+            if captured_frame is None:
+                if not self.cam_cap.running:
+                    break
+                continue
+
+            if self.last_seq > 0 and captured_frame.seq - self.last_seq > 1:
+                self.skipped += captured_frame.seq - self.last_seq - 1
+                METRICS.increment('frames_dropped', captured_frame.seq - self.last_seq - 1, reason='processing_behind')
+            self.last_seq = captured_frame.seq
+            self.processed += 1
+            yield captured_frame
+
+    def stop(self):
+        self.stop_event.set()
+
+    def sample_due(self):
+        # True once @min_sample_interval passed since the last accepted sample
+        return self.last_sample_time is None or time.monotonic() - self.last_sample_time >= self.min_sample_interval
+
+    def sample_taken(self):
+        self.last_sample_time = time.monotonic()
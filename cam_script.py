@@ -1,9 +1,19 @@
 import argparse
 from cam_capture import CameraCapture
+from cam_source import open_frame_source, CaptureProcess
 from cam_stream import CameraStream
 from cam_calib import CameraCalibration
+from cam_loader import list_images
+from cam_encoder import FrameEncoder
+from cam_incremental import IncrementalCalibrator
+from cam_robust import RobustCalibration
+from cam_metrics import METRICS, MetricsReporter
+from cam_scheduler import FrameScheduler
+from cam_detector import DetectionProcess
+from cam_writer import ImageWriter, IMAGE_FORMATS
+from cam_cache import DetectionCache
+from cam_quality import FrameQualityFilter
 import threading
-import time
 import sys
 import os
 from enum import Enum
@@ -12,9 +22,12 @@ import sys
 import termios
 import tty
 import shutil
+import cv2
+from queue import Queue, Empty
 
 
 script_dir = os.path.abspath(os.path.dirname(__file__))
+image_extensions = ['.jpg', '.jpeg', '.bmp', '.png']
 
 class ScriptRunningModes(Enum):
     STREAM_CALIBRATION = 1
@@ -22,36 +35,47 @@ class ScriptRunningModes(Enum):
     COLLECT_CALIBRATION_IMAGES = 3
 
 def run_arguments():
-    edge_length = None
-    n_height = None
-    n_width = None
-    calibration_mode = None
-    debug = False
-    
     parser = argparse.ArgumentParser(description='Camera calibration script.')
     parser.add_argument('-d', help='Enable debug options: delays, prints, debug windows.', action='store_true')
     parser.add_argument('-c', '--calibration_mode', type=int, help='Run calibration in either of the three modes: streaming live (1), pre-recorder (2), collect calibration images (3)', required=True)
     parser.add_argument('-s', '--edge_length', type=float, help='Edge length in cm')
     parser.add_argument('-vs', '--vertical_squares', type=int, help='Number of inner squares vertically.')
     parser.add_argument('-hs', '--horizontal_squares', type=int, help='Number of inner squares horizontally.')
+    parser.add_argument('-j', '--jobs', type=int, help='Number of detection worker processes for pre-recorded calibration, defaults to one per core. Each worker decodes one image at a time, only -j 1 decodes ahead with the prefetching loader.')
+    parser.add_argument('-pl', '--pyramid_levels', type=int, default=0, help='Search the checkerboard on a downscaled pyramid level first (0 - full resolution search).')
+    parser.add_argument('-n', '--n_calib_images', type=int, help='Number of live samples to collect, upper limit in incremental mode. Number of images to save in COLLECT_CALIBRATION_IMAGES mode (default - until q is pressed).')
+    parser.add_argument('-t', '--track', help='Search live frames around the previous detection first, the same frame is searched in full when the board is not there. Applies to every search after a detection, also across the sample interval.', action='store_true')
+    parser.add_argument('--track_refresh', type=int, default=30, help='Force a full frame search after this many tracked searches (0 - only after a miss).')
+    parser.add_argument('--min_sharpness', type=float, default=0, help='Skip the checkerboard search on live frames whose Laplacian variance, measured at quarter resolution, is below this (0 - off).')
+    parser.add_argument('--min_contrast', type=float, default=0, help='Skip the checkerboard search on live frames whose intensity standard deviation is below this (0 - off).')
+    parser.add_argument('-vb', '--max_views_per_bin', type=int, default=0, help='Reject live samples whose board position, scale and tilt bin already holds this many samples (0 - accept all).')
+    parser.add_argument('-i', '--incremental', help='Re-solve the calibration while collecting live samples and stop once it converged.', action='store_true')
+    parser.add_argument('--max_focal_std', type=float, default=0.005, help='Incremental calibration converges below this relative standard deviation of the focal length.')
+    parser.add_argument('--max_center_std', type=float, default=2.0, help='Incremental calibration converges below this standard deviation of the principal point in pixels.')
+    parser.add_argument('-r', '--robust', help='Reject outlier views iteratively before the final calibration.', action='store_true')
+    parser.add_argument('--max_view_rms', type=float, default=1.0, help='Robust calibration never rejects views with reprojection RMS below this many pixels.')
+    parser.add_argument('--outlier_factor', type=float, default=2.5, help='Robust calibration rejects views with RMS above this multiple of the median view RMS.')
+    parser.add_argument('-si', '--sample_interval', type=float, default=2.0, help='Minimal number of seconds between accepted live samples (0 - no limit).')
+    parser.add_argument('--cache_size', type=float, default=16, help='Size limit in MB of the detection cache reused by pre-recorded calibration runs (0 - always detect).')
+    parser.add_argument('-p', '--preview', help='Stream detection preview during pre-recorded calibration.', action='store_true')
+    parser.add_argument('--image_format', type=str, default='jpg', choices=list(IMAGE_FORMATS), help='Format of the images saved in COLLECT_CALIBRATION_IMAGES mode: jpg, png (lossless) or bmp (uncompressed).')
+    parser.add_argument('--burst', type=int, default=0, help='In COLLECT_CALIBRATION_IMAGES mode the b key starts and stops saving every this many camera frames (0 - off).')
+    parser.add_argument('--sensors', type=int, nargs='+', help='Calibrate these camera sensor ids concurrently in STREAM_CALIBRATION mode, each streamed on /cam/<id> and saved to calib_data/sensor_<id>.')
+    parser.add_argument('--source', type=str, default='camera', help='Frame source: camera, synthetic, a directory with images or a video file.')
+    parser.add_argument('--fps', type=float, help='Replay rate of a non camera source (0 - as fast as possible), defaults to the native rate of a video file and 30 otherwise.')
+    parser.add_argument('--loop', help='Start a video file or image directory source over when it ends.', action='store_true')
+    parser.add_argument('--capture_process', help='Capture in a separate process that hands the frames over through shared memory.', action='store_true')
+    parser.add_argument('--metrics_interval', type=float, default=0, help='Print a summary of the pipeline latencies every this many seconds (0 - off).')
     
     args = parser.parse_args()
 
-    # Assign passed values
-    if args.d:
-        debug = True
-    elif args.calibration_mode != None:
-        calibration_mode = ScriptRunningModes(args.calibration_mode)
-        if calibration_mode not in ScriptRunningModes:
-            calibration_mode = None
-    elif args.edge_length != None:
-        edge_length = args.edge_length
-    elif args.vertical_squares != None:
-        n_height = args.vertical_squares
-    elif args.horizontal_squares != None:
-        n_width = args.horizontal_squares
-    
-    return debug, calibration_mode, edge_length, n_height, n_width
+    # Validate the selected mode
+    try:
+        args.calibration_mode = ScriptRunningModes(args.calibration_mode)
+    except ValueError:
+        args.calibration_mode = None
+    
+    return args
 
 def create_gstreamer_pipeline(
     sensor_id=0,
@@ -80,61 +104,194 @@ def create_gstreamer_pipeline(
         )
     )
 
-def calibration_and_encoding(original_frame, cam_calib, cam_cap):
-    cam_calib.find_checkerboard_corners(original_frame)
-    ret, corner_frame = cam_calib.get_corner_image()
+def create_frame_source(args, g_pipe, cam_calib):
+    # Frame source selected by the arguments, read in this process or through a capture process
+    source_args = dict(source=args.source, gstreamer_str=g_pipe, fps=args.fps, loop=args.loop, checkerboard_size=cam_calib.checkerboard_size, edge_length=cam_calib.edge_length)
+    if args.capture_process:
+        return CaptureProcess(source_args).frame_source()
+    return open_frame_source(**source_args)
+
+def create_frame_filter(args):
+    # Blur and contrast prefilter of the live frames, None when no threshold is set
+    if args.min_sharpness <= 0 and args.min_contrast <= 0:
+        return None
+    return FrameQualityFilter(args.min_sharpness, args.min_contrast)
+
+def calibration_and_encoding(original_frame, cam_calib, frame_encoder, seq=None, timestamp=None, detect=True):
+    # @detect: Look for a new sample in the frame, otherwise the frame is only streamed
+    ret = False
+    if detect:
+        cam_calib.find_checkerboard_corners(original_frame)
+        ret, corner_frame = cam_calib.get_corner_image()
     
-    if ret:
-        frame = cam_cap.encode_frame(frame=corner_frame)
-    else:
-        frame = cam_cap.encode_frame(frame=original_frame)
+    if not ret:
+        corner_frame = original_frame
     
-    return frame
-
+    if cam_calib.view_selector is not None and corner_frame is not None:
+        # Show which regions of the frame still need samples
+        corner_frame = cam_calib.view_selector.draw_coverage(corner_frame.copy())
+    
+    # Encoded and pushed to the stream by the encoder threads
+    frame_encoder.submit(corner_frame, seq, timestamp)
 
-def run_live_calibration(cam_cap, cam_calib, cam_stream):
-    # Collect enough images
-    while not cam_calib.finished_collecting_samples():
-        try:
-            original_frame = cam_cap.latest_frame()
 
-            frame = calibration_and_encoding(original_frame, cam_calib, cam_cap)
+def run_live_calibration(cam_cap, cam_calib, cam_stream, frame_encoder, incremental_calibrator=None, sample_interval: float = 2.0):
+    if incremental_calibrator is not None:
+        incremental_calibrator.start()
+    
+    # Every new frame is processed once, samples are taken at most every sample_interval seconds
+    scheduler = FrameScheduler(cam_cap, min_sample_interval=sample_interval)
+    
+    try:
+        for captured_frame in scheduler:
+            # Collect enough images, or stop early once the incremental calibration converged
+            if cam_calib.finished_collecting_samples():
+                break
+            if incremental_calibrator is not None and incremental_calibrator.converged:
+                print('Calibration converged with %d views.' % incremental_calibrator.n_views)
+                break
             
-            cam_stream.push_frame(frame) 
-
-            time.sleep(2)
+            sample_due = scheduler.sample_due()
+            collected_samples = cam_calib.image_counter
+            calibration_and_encoding(captured_frame.image, cam_calib, frame_encoder, captured_frame.seq, captured_frame.timestamp, detect=sample_due)
+            if cam_calib.image_counter > collected_samples:
+                scheduler.sample_taken()
             
-        except KeyboardInterrupt:
-            cam_stream.stop()
-            cam_cap.stop()
-            sys.exit(-1)
+    except KeyboardInterrupt:
+        cam_stream.stop()
+        cam_cap.stop()
+        sys.exit(-1)
+    
+    if incremental_calibrator is not None:
+        incremental_calibrator.stop()
+    if cam_calib.frame_filter is not None:
+        print(cam_calib.frame_filter.summary())
 
     return cam_cap.latest_frame()
 
-def run_prerecorded_calibration(cam_cap, cam_calib, cam_stream):
-    images = load_images(cam_cap)
+def run_multi_sensor_calibration(args, board_args, debug=False):
+    # One capture, calibration, detection process and stream route per sensor, all sensors are calibrated concurrently
+    cam_stream = None
+    sensors = []
     
-    for image in images:   
-        try:
-            
-            frame = calibration_and_encoding(image, cam_calib, cam_cap)
-            
-            cam_stream.push_frame(frame) 
+    for sensor_id in args.sensors:
+        route = 'cam/%d' % sensor_id
+        if cam_stream is None:
+            cam_stream = CameraStream(route, debug=debug)
+            sensor_stream = cam_stream
+        else:
+            sensor_stream = cam_stream.add_stream(route)
+        
+        cam_calib = CameraCalibration(save_calib = True, debug=debug, pyramid_levels=args.pyramid_levels, max_views_per_bin=args.max_views_per_bin, track_board=args.track, track_refresh=args.track_refresh,
+                                      frame_filter=create_frame_filter(args), calib_dir=os.path.join(script_dir, 'calib_data', 'sensor_%d' % sensor_id), **board_args)
+        # The search runs in its own process, so the sensors do not compete for the interpreter
+        detector = DetectionProcess(cam_calib.checkerboard_size, cam_calib.detection_args(), name='detection_sensor_%d' % sensor_id)
+        cam_calib.corner_finder = detector.find_corners
+        
+        g_pipe = create_gstreamer_pipeline(sensor_id=sensor_id)
+        frame_source = create_frame_source(args, g_pipe, cam_calib)
+        
+        incremental_calibrator = None
+        if args.incremental:
+            incremental_calibrator = IncrementalCalibrator(cam_calib, max_focal_std=args.max_focal_std, max_center_std=args.max_center_std, debug=debug)
+        
+        sensors.append({
+            'id': sensor_id,
+            'cam_cap': CameraCapture(g_pipe, name='sensor_%d' % sensor_id, debug=debug, frame_source=frame_source),
+            'cam_calib': cam_calib,
+            'cam_stream': sensor_stream,
+            'frame_encoder': FrameEncoder(sensor_stream.push_frame, debug=debug),
+            'detector': detector,
+            'incremental_calibrator': incremental_calibrator,
+            'last_image': None,
+        })
+    
+    def calibrate_sensor(sensor):
+        sensor['last_image'] = run_live_calibration(sensor['cam_cap'], sensor['cam_calib'], sensor['cam_stream'], sensor['frame_encoder'], sensor['incremental_calibrator'], args.sample_interval)
+    
+    threading.Thread(target=cam_stream.start, daemon=True).start()
+    threads = []
+    for sensor in sensors:
+        threading.Thread(target=sensor['cam_cap'].capturing, daemon=True).start()
+        threads.append(threading.Thread(target=calibrate_sensor, args=(sensor,), daemon=True))
+    for thread in threads:
+        thread.start()
+    
+    try:
+        for thread in threads:
+            # Joined with a timeout so the main thread still receives the interrupt
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        # Stopping the captures ends the loops of all sensors
+        for sensor in sensors:
+            sensor['cam_cap'].stop()
+        for thread in threads:
+            thread.join()
+    
+    for sensor in sensors:
+        sensor['cam_cap'].stop()
+        sensor['frame_encoder'].stop()
+        sensor['detector'].stop()
+    cam_stream.stop()
+    
+    return sensors
 
-            time.sleep(2)
-            
-        except KeyboardInterrupt:
-            cam_stream.stop()
-            cam_cap.stop()
-            sys.exit(-1)
+def run_prerecorded_calibration(cam_cap, cam_calib, cam_stream, jobs=None, preview=False, cache_size: float = 16):
+    image_paths = get_calibration_image_paths()
+    preview_q = None
+    
+    # Detections of unchanged images are reused from earlier runs with the same detector settings
+    detection_cache = None
+    if cache_size > 0:
+        detection_cache = DetectionCache(os.path.join(script_dir, 'calib_data', 'detections.cache'), max_bytes=int(cache_size * 2 ** 20))
+    
+    if preview:
+        # Preview is rendered on its own thread and only the newest result is kept, so it never throttles detection
+        preview_q = Queue(maxsize=1)
+        preview_thread = threading.Thread(target=stream_preview, args=(preview_q, cam_calib, cam_cap, cam_stream), daemon=True)
+        preview_thread.start()
     
-    return image
+    def on_result(image_path, ret, corners):
+        if preview_q.full():
+            try:
+                preview_q.get_nowait()
+            except Empty:
+                pass
+        preview_q.put((image_path, ret, corners))
+    
+    try:
+        cam_calib.find_checkerboard_corners_batch(image_paths, workers=jobs, on_result=on_result if preview else None, detection_cache=detection_cache)
+    except KeyboardInterrupt:
+        cam_stream.stop()
+        cam_cap.stop()
+        sys.exit(-1)
+    
+    if preview:
+        preview_q.put(None)
+        preview_thread.join()
 
-def run_collect_images(cam_cap, cam_stream):
+def stream_preview(preview_q, cam_calib, cam_cap, cam_stream):
+    while True:
+        result = preview_q.get()
+        if result is None:
+            break
+        
+        image_path, ret, corners = result
+        image = cam_cap.load_image(image_path)
+        if image is None:
+            continue
+        
+        if ret:
+            image = cv2.drawChessboardCorners(image, cam_calib.checkerboard_size, corners, ret)
+        cam_stream.push_frame(cam_cap.encode_frame(frame=image), image=image)
+
+def run_collect_images(cam_cap, cam_stream, frame_encoder, n_images: int = None, image_format: str = 'jpg', burst_interval: int = 0):
     
     # Set the terminal to raw mode to read keys without waiting for Enter to be pressed
     old_settings = termios.tcgetattr(sys.stdin)
     tty.setraw(sys.stdin.fileno())
+    image_writer = None
     
     try:
         calibration_image_directory = os.path.join(script_dir, 'calib_images')
@@ -144,27 +301,47 @@ def run_collect_images(cam_cap, cam_stream):
             
         os.mkdir(calibration_image_directory)
         
+        # Encoding and writing happen on the writer thread, saving only queues the frame
+        image_writer = ImageWriter(calibration_image_directory, image_format)
         saved_images = 0
+        last_seq = 0
+        burst = False
+        last_burst_seq = 0
+        
+        print('\rPress s to save the current frame%s, q to quit.' % (', b to start or stop saving every %d. frame' % burst_interval if burst_interval > 0 else ''))
         
-        while saved_images < 50:
-            original_frame = cam_cap.latest_frame()
-            frame = cam_cap.encode_frame(frame=original_frame)
-            cam_stream.push_frame(frame)
+        while n_images is None or saved_images < n_images:
+            # Wakes up for every new frame and often enough to read the keys
+            captured_frame = cam_cap.wait_for_frame(last_seq, 0.05)
+            if captured_frame is not None:
+                last_seq = captured_frame.seq
+                frame_encoder.submit(captured_frame.image, captured_frame.seq, captured_frame.timestamp)
+                
+                if burst and captured_frame.seq - last_burst_seq >= burst_interval:
+                    last_burst_seq = captured_frame.seq
+                    if image_writer.save(captured_frame.image, 'image_' + str(saved_images)):
+                        saved_images += 1
+            elif not cam_cap.running:
+                print('\rCapture stopped.')
+                break
             
             if select.select([sys.stdin], [], [], 0) == ([sys.stdin], [], []):
                 key = sys.stdin.read(1)
                 if key == 's':
-                    calibration_image_name = 'image_' + str(saved_images) + '.jpg'
-                    if cam_cap.save_image(calibration_image_name, calibration_image_directory):
+                    captured_frame = cam_cap.latest_captured_frame()
+                    if captured_frame is not None and image_writer.save(captured_frame.image, 'image_' + str(saved_images)):
                         saved_images += 1
-                    print('\rNumber of saved images: %d' % saved_images)
+                    print('\rNumber of saved images: %d, waiting to be written: %d' % (saved_images, image_writer.queue_depth()))
+                elif key == 'b' and burst_interval > 0:
+                    burst = not burst
+                    print('\rBurst mode %s, number of saved images: %d' % ('started' if burst else 'stopped', saved_images))
                 elif key == 'q':
                     print('\rQuit command received early, this will exit the script...')
-                    termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
-                    sys.exit(0)
-                
-            time.sleep(0.2)
+                    break
         
+        # Writes the frames still in the queue
+        image_writer.stop()
+        print('\r' + image_writer.summary())
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
         
     except OSError as e:
@@ -175,45 +352,89 @@ def run_collect_images(cam_cap, cam_stream):
     except KeyboardInterrupt:
         cam_stream.stop()
         cam_cap.stop()
+        if image_writer is not None:
+            image_writer.stop()
         termios.tcsetattr(sys.stdin, termios.TCSADRAIN, old_settings)
         sys.exit(-1)
     
 
 
-def load_images(cam_cap):
-    image_extensions = ['.jpg', '.jpeg', '.bmp', '.png']
+def get_calibration_image_paths():
     recorded_images_for_calib = os.path.join(script_dir, 'calib_images')
     
     if not os.path.exists(recorded_images_for_calib):
         print('calib_images directory does not exist. Check that calib_images directory exists')
         sys.exit(-1)
-    elif len(os.listdir(recorded_images_for_calib)) == 0:
+    
+    image_paths = list_images(recorded_images_for_calib, image_extensions)
+    
+    if len(image_paths) == 0:
         print('No images found in calib_images.')
         sys.exit(-1)
-    else:
-        images = [cam_cap.load_image(os.path.join(recorded_images_for_calib, image)) for image in os.listdir(recorded_images_for_calib)]
-
-        return images
+    
+    return image_paths
 
 if __name__ == "__main__":
     # Get runtime arguments
-    debug, calibration_mode, edge_length, n_height, n_width = run_arguments()
+    args = run_arguments()
+    debug = args.d
+    calibration_mode = args.calibration_mode
     
     if calibration_mode is None:
         print('Incorrect mode selected. Exiting...')
         sys.exit(-1)
     
-    # Create GStreamer pipeline
-    g_pipe = create_gstreamer_pipeline()
-
-    # Create Camera capture object
-    cam_cap = CameraCapture(g_pipe, debug=debug)
+    # Create camera calibration object
+    board_args = {}
+    if args.edge_length is not None:
+        board_args['edge_length'] = args.edge_length
+    if args.vertical_squares is not None:
+        board_args['n_vertical'] = args.vertical_squares
+    if args.horizontal_squares is not None:
+        board_args['n_horizontal'] = args.horizontal_squares
+    if args.n_calib_images is not None:
+        board_args['n_calib_images'] = args.n_calib_images
+    
+    metrics_reporter = None
+    if args.metrics_interval > 0:
+        metrics_reporter = MetricsReporter(METRICS, args.metrics_interval)
+        metrics_reporter.start()
+    
+    robust = None
+    if args.robust:
+        robust = RobustCalibration(max_view_rms=args.max_view_rms, outlier_factor=args.outlier_factor, workers=args.jobs, debug=debug)
+    
+    if args.sensors is not None:
+        if calibration_mode is not ScriptRunningModes.STREAM_CALIBRATION:
+            print('Multiple sensors are only supported in STREAM_CALIBRATION mode. Exiting...')
+            sys.exit(-1)
+        
+        sensors = run_multi_sensor_calibration(args, board_args, debug)
+        if metrics_reporter is not None:
+            metrics_reporter.stop()
+            print(METRICS.summary())
+        
+        # Solved one after the other, the robust calibration already uses all cores
+        for sensor in sensors:
+            print('Sensor %d:' % sensor['id'])
+            sensor['cam_calib'].calibration(sensor['last_image'], robust=robust)
+            sensor['cam_calib'].reprojection_error()
+        sys.exit(0)
     
     # Create streaming object
     cam_stream = CameraStream(debug=debug)
     
-    # Create camera calibration object
-    cam_calib = CameraCalibration(save_calib = True, debug=debug)
+    # Create encoder that pushes the encoded frames to the stream
+    frame_encoder = FrameEncoder(cam_stream.push_frame, debug=debug)
+    
+    cam_calib = CameraCalibration(save_calib = True, debug=debug, pyramid_levels=args.pyramid_levels, max_views_per_bin=args.max_views_per_bin, track_board=args.track, track_refresh=args.track_refresh, frame_filter=create_frame_filter(args), **board_args)
+    
+    # Create GStreamer pipeline
+    g_pipe = create_gstreamer_pipeline()
+
+    # Create Camera capture object, reading from the camera or a replayed source
+    frame_source = create_frame_source(args, g_pipe, cam_calib)
+    cam_cap = CameraCapture(g_pipe, debug=debug, frame_source=frame_source)
         
     # Start camera streaming
     # Create a thread and attach the method that captures the image frames, to it
@@ -226,19 +447,27 @@ if __name__ == "__main__":
     
     # Run selected mode
     if calibration_mode is ScriptRunningModes.STREAM_CALIBRATION:
-        last_image = run_live_calibration(cam_cap, cam_calib, cam_stream)
+        incremental_calibrator = None
+        if args.incremental:
+            incremental_calibrator = IncrementalCalibrator(cam_calib, max_focal_std=args.max_focal_std, max_center_std=args.max_center_std, debug=debug)
+        last_image = run_live_calibration(cam_cap, cam_calib, cam_stream, frame_encoder, incremental_calibrator, args.sample_interval)
     elif calibration_mode is ScriptRunningModes.CALIBRATION_ON_PRERECORDED_IMAGES:
-        last_image = run_prerecorded_calibration(cam_cap, cam_calib, cam_stream)
+        run_prerecorded_calibration(cam_cap, cam_calib, cam_stream, jobs=args.jobs, preview=args.preview, cache_size=args.cache_size)
+        last_image = None
     elif calibration_mode is ScriptRunningModes.COLLECT_CALIBRATION_IMAGES:
-        run_collect_images(cam_cap, cam_stream)
+        run_collect_images(cam_cap, cam_stream, frame_encoder, args.n_calib_images, args.image_format, args.burst)
 
        
     # Perform calibration                
     cam_cap.stop()
+    frame_encoder.stop()
     cam_stream.stop()
+    if metrics_reporter is not None:
+        metrics_reporter.stop()
+        print(METRICS.summary())
     
     if calibration_mode is not ScriptRunningModes.COLLECT_CALIBRATION_IMAGES:
-        cam_calib.calibration(last_image)
+        cam_calib.calibration(last_image, robust=robust)
         cam_calib.reprojection_error()
 
     sys.exit(0)
@@ -0,0 +1,190 @@
+import multiprocessing
+import time
+import weakref
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Frame read from a SharedFrameRing, image is a view into the shared memory valid until the frame is released
+SharedFrame = namedtuple('SharedFrame', ['image', 'seq', 'timestamp', 'slot'])
+
+# Per slot metadata columns
+_SEQ, _PINS, _HEIGHT, _WIDTH, _CHANNELS = range(5)
+# Header: latest sequence number, closed flag
+_HEADER_BYTES = 64
+_ALIGNMENT = 64
+
+def _aligned(size: int):
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+def _unlink(shared_memory_block):
+    # Removes the block once the owning ring is closed or garbage collected, also on interpreter exit
+    try:
+        shared_memory_block.unlink()
+    except FileNotFoundError:
+        pass
+
+'''
+Ring buffer of uint8 frames in shared memory, for handing frames between processes without pickling them.
+Every slot holds one frame of up to @slot_bytes bytes together with its shape, sequence number and capture timestamp.
+Readers get a NumPy view into the shared memory. With @synchronized a read frame is pinned until it is released,
+and the writer never reuses a pinned slot or the slot of the newest frame. When every other slot is pinned,
+the new frame is dropped. Without @synchronized the caller has to make sure a slot is not overwritten
+while it is being read, e.g. with a request/response handshake over a pipe.
+The ring is passed to other processes by pickling it, the receiving process attaches to the same memory.
+A synchronized ring can only be passed to processes as an argument when they are started.
+The creating process owns the memory and removes it on close(), at garbage collection or at exit.
+@slot_bytes: Capacity of a slot, e.g. height * width * 3 of the largest BGR frame
+@n_slots: Number of slots
+@synchronized: Coordinate the slots with a process shared lock and notify readers of new frames
+'''
+class SharedFrameRing:
+    def __init__(self, slot_bytes: int, n_slots: int = 4, synchronized: bool = True):
+        self.slot_bytes = int(slot_bytes)
+        self.n_slots = max(2, n_slots)
+        self.condition = multiprocessing.get_context('spawn').Condition() if synchronized else None
+        self.shared_memory = shared_memory.SharedMemory(create=True, size=self._size())
+        self.owner = True
+        self._finalizer = weakref.finalize(self, _unlink, self.shared_memory)
+        self._map()
+        self.header[:] = 0
+        self.meta[:] = 0
+        self.timestamps[:] = 0
+        # Round robin position of an unsynchronized ring
+        self.next_slot = 0
+
+    def __getstate__(self):
+        return {'name': self.shared_memory.name, 'slot_bytes': self.slot_bytes, 'n_slots': self.n_slots, 'condition': self.condition}
+
+    def __setstate__(self, state):
+        self.slot_bytes = state['slot_bytes']
+        self.n_slots = state['n_slots']
+        self.condition = state['condition']
+        self.shared_memory = shared_memory.SharedMemory(name=state['name'])
+        self.owner = False
+        self._finalizer = None
+        self._map()
+        self.next_slot = 0
+
+    def _size(self):
+        return _HEADER_BYTES + _aligned(self.n_slots * 5 * 8) + _aligned(self.n_slots * 8) + self.n_slots * _aligned(self.slot_bytes)
+
+    def _map(self):
+        buffer = self.shared_memory.buf
+        self.header = np.ndarray((2,), np.int64, buffer, 0)
+        offset = _HEADER_BYTES
+        self.meta = np.ndarray((self.n_slots, 5), np.int64, buffer, offset)
+        offset += _aligned(self.n_slots * 5 * 8)
+        self.timestamps = np.ndarray((self.n_slots,), np.float64, buffer, offset)
+        offset += _aligned(self.n_slots * 8)
+        self.data_offset = offset
+
+    def _slot_view(self, slot: int, shape):
+        offset = self.data_offset + slot * _aligned(self.slot_bytes)
+        return np.ndarray(shape, np.uint8, self.shared_memory.buf, offset)
+
+    @property
+    def closed(self):
+        return bool(self.header[1])
+
+    @property
+    def latest_seq(self):
+        return int(self.header[0])
+
+    def write(self, image, timestamp: float = None):
+        # Copies the frame into a free slot, returns its sequence number or 0 if the frame was dropped
+        image = np.asarray(image)
+        if image.dtype != np.uint8 or image.nbytes > self.slot_bytes:
+            print('SHARED_MEMORY: Frame %s %s does not fit a slot of %d bytes, dropped.' % (image.shape, image.dtype, self.slot_bytes))
+            return 0
+        shape = image.shape + (1,) * (3 - image.ndim)
+        timestamp = time.monotonic() if timestamp is None else timestamp
+
+        if self.condition is None:
+            slot = self.next_slot
+            self.next_slot = (self.next_slot + 1) % self.n_slots
+        else:
+            with self.condition:
+                # Oldest slot nobody reads and not holding the newest frame
+                free = [slot for slot in range(self.n_slots) if self.meta[slot, _PINS] == 0 and (self.meta[slot, _SEQ] != self.header[0] or self.header[0] == 0)]
+                if not free:
+                    return 0
+                slot = min(free, key=lambda slot: self.meta[slot, _SEQ])
+                # Invalid while the data is copied
+                self.meta[slot, _SEQ] = 0
+
+        self._slot_view(slot, image.shape)[...] = image
+
+        if self.condition is None:
+            seq = self._publish(slot, shape, timestamp)
+        else:
+            with self.condition:
+                seq = self._publish(slot, shape, timestamp)
+                self.condition.notify_all()
+        return seq
+
+    def _publish(self, slot, shape, timestamp):
+        seq = int(self.header[0]) + 1
+        self.meta[slot, _HEIGHT], self.meta[slot, _WIDTH], self.meta[slot, _CHANNELS] = shape
+        self.timestamps[slot] = timestamp
+        self.meta[slot, _SEQ] = seq
+        self.header[0] = seq
+        return seq
+
+    def read(self, newer_than: int = 0, timeout: float = None):
+        # Newest frame with a sequence number greater than @newer_than, pinned until release().
+        # Returns None on timeout or once the writer closed the ring. Only for synchronized rings.
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.header[0] > newer_than or self.header[1], timeout):
+                return None
+            if self.header[0] <= newer_than:
+                return None
+            return self._frame(self._find_slot(int(self.header[0])))
+
+    def get(self, seq: int):
+        # Frame with the given sequence number if it is still in the ring, pinned on a synchronized ring
+        if self.condition is None:
+            slot = self._find_slot(seq)
+            return self._frame(slot) if slot is not None else None
+        with self.condition:
+            slot = self._find_slot(seq)
+            return self._frame(slot) if slot is not None else None
+
+    def _find_slot(self, seq):
+        for slot in range(self.n_slots):
+            if self.meta[slot, _SEQ] == seq:
+                return slot
+        return None
+
+    def _frame(self, slot):
+        if self.condition is not None:
+            self.meta[slot, _PINS] += 1
+        height, width, channels = self.meta[slot, _HEIGHT:_CHANNELS + 1]
+        shape = (height, width) if channels == 1 else (height, width, channels)
+        return SharedFrame(self._slot_view(slot, shape), int(self.meta[slot, _SEQ]), float(self.timestamps[slot]), slot)
+
+    def release(self, frame):
+        # The view of the frame must not be used afterwards
+        if self.condition is not None:
+            with self.condition:
+                self.meta[frame.slot, _PINS] -= 1
+
+    def close_writer(self):
+        # No more frames will be written, wakes up the readers
+        if self.condition is None:
+            self.header[1] = 1
+            return
+        with self.condition:
+            self.header[1] = 1
+            self.condition.notify_all()
+
+    def close(self):
+        # Detach from the memory, the owner also removes it. Views of unreleased frames keep the mapping alive.
+        self.header = self.meta = self.timestamps = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            print('SHARED_MEMORY: Frames of %s are still in use, the memory is unmapped when they are gone.' % self.shared_memory.name)
+        if self._finalizer is not None:
+            self._finalizer()
@@ -0,0 +1,242 @@
+import cv2
+import multiprocessing
+import os
+import time
+
+from cam_loader import list_images
+from cam_shm import SharedFrameRing
+from cam_synthetic import SyntheticCheckerboard, default_camera
+
+# Frame sources for CameraCapture, every source has the part of the cv2.VideoCapture interface used by the capture thread:
+# isOpened(), read() -> (success, frame) and release()
+
+# Extensions of the images read by ImageDirectorySource
+SOURCE_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.bmp', '.png']
+
+'''
+Video file source.
+@path: Path of the video file
+@loop: Start over at the end of the file instead of ending the capture
+'''
+class VideoFileSource:
+    def __init__(self, path: str, loop: bool = False):
+        self.path = path
+        self.loop = loop
+        self.video_capture = cv2.VideoCapture(path)
+
+    def isOpened(self):
+        return self.video_capture.isOpened()
+
+    def read(self):
+        success, frame = self.video_capture.read()
+        if not success and self.loop:
+            self.video_capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            success, frame = self.video_capture.read()
+        return success, frame
+
+    def native_fps(self):
+        # Frame rate the file was recorded at, 0 if unknown
+        fps = self.video_capture.get(cv2.CAP_PROP_FPS)
+        return fps if fps and fps > 0 else 0
+
+    def release(self):
+        self.video_capture.release()
+
+'''
+Image directory source, the images are read in filename order.
+@image_directory: Directory with the images
+@loop: Start over with the first image after the last one instead of ending the capture
+'''
+class ImageDirectorySource:
+    def __init__(self, image_directory: str, loop: bool = False):
+        self.image_paths = list_images(image_directory, SOURCE_IMAGE_EXTENSIONS) if os.path.isdir(image_directory) else []
+        self.loop = loop
+        self.index = 0
+        self.opened = len(self.image_paths) > 0
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        while self.opened:
+            if self.index >= len(self.image_paths):
+                if not self.loop:
+                    return False, None
+                self.index = 0
+
+            image_path = self.image_paths[self.index]
+            self.index += 1
+            frame = cv2.imread(image_path)
+            if frame is not None:
+                return True, frame
+            print('SOURCE: Could not read %s, skipping.' % image_path)
+        return False, None
+
+    def release(self):
+        self.opened = False
+
+'''
+Synthetic checkerboard source, cycles through views rendered once up front by cam_synthetic.
+The views are rendered before the capture starts, so reading a frame costs nothing and the source never limits the throughput.
+@image_size: (width, height) of the frames
+@checkerboard_size: Inner corners of the board (horizontal, vertical)
+@edge_length: Edge length of the squares
+@n_views: Number of distinct views to cycle through
+@seed: Seed of the rendered poses and noise
+'''
+class SyntheticSource:
+    def __init__(self, image_size=(1920, 1080), checkerboard_size=(6, 8), edge_length: float = 0.108, n_views: int = 30, seed: int = 0):
+        cam_mat, dist_coeff = default_camera(image_size)
+        synthetic = SyntheticCheckerboard(checkerboard_size, edge_length, cam_mat, dist_coeff, image_size, seed=seed)
+        # Camera frames are BGR
+        self.frames = [cv2.cvtColor(image, cv2.COLOR_GRAY2BGR) for image, _, _, _ in synthetic.render_views(n_views)]
+        self.index = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        frame = self.frames[self.index]
+        self.index = (self.index + 1) % len(self.frames)
+        return True, frame
+
+    def release(self):
+        self.opened = False
+
+'''
+Replays another source at a fixed frame rate, like a live camera would deliver it.
+A reader that falls behind is not given a burst of frames to catch up, the schedule restarts from the late frame.
+@source: Wrapped frame source
+@fps: Frames per second, 0 reads as fast as possible
+'''
+class PacedSource:
+    def __init__(self, source, fps: float = 30.0):
+        self.source = source
+        self.period = 1.0 / fps if fps > 0 else 0.0
+        self.next_frame_time = None
+
+    def isOpened(self):
+        return self.source.isOpened()
+
+    def read(self):
+        if self.period > 0:
+            now = time.monotonic()
+            if self.next_frame_time is None or now - self.next_frame_time > self.period:
+                self.next_frame_time = now
+            elif self.next_frame_time > now:
+                time.sleep(self.next_frame_time - now)
+            self.next_frame_time += self.period
+        return self.source.read()
+
+    def release(self):
+        self.source.release()
+
+def open_frame_source(source: str, gstreamer_str: str = '', fps: float = None, loop: bool = False, image_size=(1920, 1080), checkerboard_size=(6, 8), edge_length: float = 0.108):
+    '''
+    Open a frame source from its description:
+    camera - the camera through @gstreamer_str
+    synthetic - rendered checkerboard views of @image_size
+    a directory - the images in the directory
+    anything else - a video file
+    @fps: Replay rate, 0 as fast as possible. Video files default to their native rate, images and synthetic views to 30 fps.
+    The camera is never paced.
+    '''
+    if source == 'camera':
+        return cv2.VideoCapture(gstreamer_str, cv2.CAP_GSTREAMER)
+
+    if source == 'synthetic':
+        frame_source = SyntheticSource(image_size, checkerboard_size, edge_length)
+        default_fps = 30.0
+    elif os.path.isdir(source):
+        frame_source = ImageDirectorySource(source, loop)
+        default_fps = 30.0
+    else:
+        frame_source = VideoFileSource(source, loop)
+        default_fps = frame_source.native_fps() or 30.0
+
+    if not frame_source.isOpened():
+        print('SOURCE: Could not open %s.' % source)
+
+    return PacedSource(frame_source, default_fps if fps is None else fps)
+
+def _capture_process(frame_ring, source_args):
+    # Runs in the capture process until the source ends or the ring is closed by the reading side
+    frame_source = open_frame_source(**source_args)
+    while not frame_ring.closed and frame_source.isOpened():
+        success, frame = frame_source.read()
+        if not success or frame is None:
+            break
+        frame_ring.write(frame)
+    frame_source.release()
+    frame_ring.close_writer()
+    frame_ring.close()
+
+'''
+Captures in a dedicated process that writes the frames into a SharedFrameRing,
+so decoding and the camera backend do not compete with the processing for the interpreter of the main process.
+@source_args: Keyword arguments of open_frame_source, opened in the capture process
+@max_frame_shape: (height, width, channels) of the largest frame, sizes the slots of the ring
+@n_slots: Slots of the ring, frames are dropped when the readers pin all but the newest one
+'''
+class CaptureProcess:
+    def __init__(self, source_args, max_frame_shape=(1080, 1920, 3), n_slots: int = 4):
+        height, width, channels = max_frame_shape
+        self.frame_ring = SharedFrameRing(height * width * channels, n_slots)
+        self.process = multiprocessing.get_context('spawn').Process(target=_capture_process, args=(self.frame_ring, dict(source_args)), name='capture', daemon=True)
+        self.process.start()
+        self.stopped = False
+
+    def frame_source(self):
+        # Source for CameraCapture reading from this process, releasing it stops the process
+        return SharedFrameSource(self.frame_ring, self)
+
+    def stop(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.frame_ring.close_writer()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.frame_ring.close()
+
+'''
+Source reading the frames of a CaptureProcess from its SharedFrameRing.
+Every read copies the newest frame out of the ring once, the CameraCapture readers keep references to their frames
+for longer than a slot lives. Frames written while the previous one was copied are skipped like on a live camera.
+@frame_ring: Ring written by the capture process
+@capture_process: Process stopped on release, None to leave it running
+@poll_interval: Seconds between checks whether the capture process is still alive while waiting for a frame
+'''
+class SharedFrameSource:
+    def __init__(self, frame_ring, capture_process=None, poll_interval: float = 0.1):
+        self.frame_ring = frame_ring
+        self.capture_process = capture_process
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        while self.opened:
+            shared_frame = self.frame_ring.read(self.last_seq, self.poll_interval)
+            if shared_frame is not None:
+                frame = shared_frame.image.copy()
+                self.last_seq = shared_frame.seq
+                self.frame_ring.release(shared_frame)
+                return True, frame
+            if self.frame_ring.closed or (self.capture_process is not None and not self.capture_process.process.is_alive()):
+                break
+        return False, None
+
+    def release(self):
+        if not self.opened:
+            return
+        self.opened = False
+        if self.capture_process is not None:
+            self.capture_process.stop()
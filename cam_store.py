@@ -0,0 +1,189 @@
+import numpy as np
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+# Archive layout: magic, format version, header length, JSON header, 64 byte aligned raw arrays
+ARCHIVE_MAGIC = b'CCAL'
+ARCHIVE_VERSION = 1
+ARCHIVE_EXTENSION = '.calib'
+ARCHIVE_ALIGNMENT = 64
+PREAMBLE = struct.Struct('<4sII')
+
+# Files of the calibration layout used before the archives
+TXT_FILE_NAMES = ['cam_matrix.txt', 'dist_coeffs.txt', 'r_vecs.txt', 't_vecs.txt']
+
+def write_archive(archive_path: str, arrays: dict, meta: dict):
+    # Header describes every array by dtype, shape and offset from the start of the file
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    descriptors = {}
+    header = {'version': ARCHIVE_VERSION, 'meta': meta, 'arrays': descriptors}
+
+    # Offsets depend on the header length, so grow the reserved header space until it fits
+    header_space = 1024
+    while True:
+        offset = _align(PREAMBLE.size + header_space)
+        for name, array in arrays.items():
+            descriptors[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode('utf-8')
+        if len(header_bytes) <= header_space:
+            break
+        header_space *= 2
+
+    # Write to a temporary file first so a crash never leaves a truncated archive behind
+    temporary_path = archive_path + '.tmp'
+    with open(temporary_path, 'wb') as archive:
+        archive.write(PREAMBLE.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION, header_space))
+        archive.write(header_bytes.ljust(header_space, b' '))
+        for name, array in arrays.items():
+            archive.seek(descriptors[name]['offset'])
+            archive.write(array.tobytes())
+        archive.flush()
+        os.fsync(archive.fileno())
+    os.replace(temporary_path, archive_path)
+
+def read_archive(archive_path: str):
+    # Arrays are returned as read-only views of a memory map, nothing is parsed or copied
+    with open(archive_path, 'rb') as archive:
+        magic, version, header_space = PREAMBLE.unpack(archive.read(PREAMBLE.size))
+        if magic != ARCHIVE_MAGIC:
+            raise ValueError('%s is not a calibration archive.' % archive_path)
+        if version > ARCHIVE_VERSION:
+            raise ValueError('%s has format version %d, newest supported is %d.' % (archive_path, version, ARCHIVE_VERSION))
+        header = json.loads(archive.read(header_space).decode('utf-8'))
+
+    mapped_file = np.memmap(archive_path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, descriptor in header['arrays'].items():
+        dtype = np.dtype(descriptor['dtype'])
+        shape = tuple(descriptor['shape'])
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        start = descriptor['offset']
+        arrays[name] = mapped_file[start:start + nbytes].view(dtype).reshape(shape)
+
+    return arrays, header['meta']
+
+def _align(offset):
+    return (offset + ARCHIVE_ALIGNMENT - 1) // ARCHIVE_ALIGNMENT * ARCHIVE_ALIGNMENT
+
+'''
+Versioned store of calibration results.
+Every calibration run is written into its own binary archive in @root_folder_path, previous runs are kept as history.
+The 'latest' file holds the name of the newest archive.
+Loaded calibrations are dictionaries with keys: cam_mat, dist_coeff, rvecs, tvecs, image_size, rms,
+checkerboard_size, edge_length, created and any extra arrays saved with the run.
+@root_folder_path: Directory holding the archives, e.g. calib_data
+'''
+class CalibrationStore:
+    latest_file_name = 'latest'
+
+    def __init__(self, root_folder_path: str):
+        self.root_folder_path = root_folder_path
+
+    def save(self, rms, cam_mat, dist_coeff, rvecs, tvecs, image_size, checkerboard_size, edge_length, extra_arrays: dict = None, extra_meta: dict = None):
+        os.makedirs(self.root_folder_path, exist_ok=True)
+
+        arrays = {
+            'cam_mat': np.asarray(cam_mat, dtype=np.float64).reshape(3, 3),
+            'dist_coeff': np.asarray(dist_coeff, dtype=np.float64).reshape(-1),
+            # Per view extrinsics as (views, 3)
+            'rvecs': np.asarray(rvecs, dtype=np.float64).reshape(-1, 3),
+            'tvecs': np.asarray(tvecs, dtype=np.float64).reshape(-1, 3),
+        }
+        if extra_arrays:
+            arrays.update(extra_arrays)
+
+        created = time.time()
+        meta = {
+            'rms': float(rms),
+            'image_size': [int(size) for size in image_size],
+            'checkerboard_size': [int(size) for size in checkerboard_size],
+            'edge_length': float(edge_length),
+            'created': created,
+        }
+        if extra_meta:
+            meta.update(extra_meta)
+
+        archive_name = 'calib_' + datetime.fromtimestamp(created).strftime('%Y%m%d_%H%M%S_%f') + ARCHIVE_EXTENSION
+        archive_path = os.path.join(self.root_folder_path, archive_name)
+        write_archive(archive_path, arrays, meta)
+        self._set_latest(archive_name)
+
+        return archive_path
+
+    def load(self, archive_path: str = None):
+        # Latest archive if no path is given, None if there is nothing to load
+        if archive_path is None:
+            archive_path = self.latest_path()
+            if archive_path is None:
+                return None
+
+        arrays, meta = read_archive(archive_path)
+        calibration = dict(meta)
+        calibration.update(arrays)
+        calibration['path'] = archive_path
+        return calibration
+
+    def latest_path(self):
+        latest_file_path = os.path.join(self.root_folder_path, self.latest_file_name)
+        if os.path.exists(latest_file_path):
+            with open(latest_file_path) as latest_file:
+                archive_path = os.path.join(self.root_folder_path, latest_file.read().strip())
+            if os.path.exists(archive_path):
+                return archive_path
+
+        # Pointer missing or stale, fall back to the newest archive on disk
+        history = self.history()
+        return history[-1] if history else None
+
+    def history(self):
+        # Archive paths, oldest first
+        if not os.path.exists(self.root_folder_path):
+            return []
+        return sorted(os.path.join(self.root_folder_path, file) for file in os.listdir(self.root_folder_path)
+                      if file.endswith(ARCHIVE_EXTENSION))
+
+    def has_txt_calibration(self):
+        return all(os.path.exists(os.path.join(self.root_folder_path, file)) for file in TXT_FILE_NAMES)
+
+    def load_txt(self):
+        # Calibration in the CSV txt layout written by earlier versions, without image size and board geometry
+        file_paths = [os.path.join(self.root_folder_path, file) for file in TXT_FILE_NAMES]
+        cam_mat, dist_coeff, rvecs, tvecs = [np.loadtxt(file_path, dtype=float, delimiter=',', ndmin=2) for file_path in file_paths]
+        return {'cam_mat': cam_mat.reshape(3, 3), 'dist_coeff': dist_coeff.reshape(-1),
+                'rvecs': rvecs.reshape(-1, 3), 'tvecs': tvecs.reshape(-1, 3)}
+
+    def convert_txt(self, image_size=(0, 0), checkerboard_size=(0, 0), edge_length: float = 0.0, rms: float = float('nan')):
+        # Unknown values of the txt layout are stored as zeros/NaN
+        calibration = self.load_txt()
+        return self.save(rms, calibration['cam_mat'], calibration['dist_coeff'], calibration['rvecs'], calibration['tvecs'],
+                         image_size, checkerboard_size, edge_length, extra_meta={'converted_from': 'txt'})
+
+    def _set_latest(self, archive_name):
+        latest_file_path = os.path.join(self.root_folder_path, self.latest_file_name)
+        with open(latest_file_path + '.tmp', 'w') as latest_file:
+            latest_file.write(archive_name)
+        os.replace(latest_file_path + '.tmp', latest_file_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert calibration in the txt layout into a calibration archive.')
+    parser.add_argument('folder', help='Directory with cam_matrix.txt, dist_coeffs.txt, r_vecs.txt and t_vecs.txt.')
+    parser.add_argument('--width', type=int, default=1920, help='Width of the calibrated images.')
+    parser.add_argument('--height', type=int, default=1080, help='Height of the calibrated images.')
+    parser.add_argument('-s', '--edge_length', type=float, default=0.108, help='Edge length of the checkerboard squares.')
+    parser.add_argument('-vs', '--vertical_squares', type=int, default=8, help='Number of inner squares vertically.')
+    parser.add_argument('-hs', '--horizontal_squares', type=int, default=6, help='Number of inner squares horizontally.')
+    args = parser.parse_args()
+
+    store = CalibrationStore(args.folder)
+    if not store.has_txt_calibration():
+        print('No txt calibration found in %s.' % args.folder)
+        sys.exit(-1)
+
+    archive_path = store.convert_txt((args.width, args.height), (args.horizontal_squares, args.vertical_squares), args.edge_length)
+    print('Converted calibration to %s' % archive_path)
@@ -1,60 +1,244 @@
-from flask import Flask, Response
+from flask import Flask, Response, jsonify, request
+import cv2
 import threading
-from queue import Queue
+import itertools
+import time
 
-lock = threading.Lock()
+# Frames pushed already encoded are treated as the default quality variant
+from cam_encoder import DEFAULT_JPEG_QUALITY, encode_jpeg
+from cam_metrics import METRICS
 
+# Steps used when adapting a client that falls behind, snapped so that clients share the variants
+ADAPTIVE_QUALITY_STEPS = [95, 80, 65, 50, 35]
+ADAPTIVE_SCALE_STEPS = [1.0, 0.75, 0.5, 0.25]
+
+'''
+MJPEG stream over Flask.
+Frames are published once with push_frame and every connected client receives the newest frame.
+Slow clients skip the intermediate frames instead of queueing them up, the skipped frames are counted per client.
+Clients can ask for a smaller or lower quality stream with query parameters, e.g. /?scale=0.5&quality=60&fps=5,
+and are stepped down automatically when writing to their socket takes longer than a frame period.
+Every variant is encoded at most once per frame and shared by all clients asking for it.
+Latency histograms and frame counters of the whole pipeline are served on /metrics in the Prometheus text format.
+Further streams served by the same server on their own routes are created with add_stream, e.g. one per camera.
+@video_stream: Route of the stream, the client statistics are served on <route>/clients
+@port: Port to serve on
+@debug: Flag to enable debug prints
+@adaptive: Flag to enable the automatic quality adaptation
+@app: Flask app of the stream serving this one, set by add_stream
+'''
 class CameraStream():
-    def __init__(self, video_stream: str = '/', port: int = 8000, debug = False):
-        self.frame_q = Queue(maxsize=1)
+    def __init__(self, video_stream: str = '/', port: int = 8000, debug = False, adaptive: bool = True, app=None):
+        self.frame = None
+        self.image = None
+        self.frame_seq = 0
+        self.frame_time = None
+        # Capture timestamp of the current frame, for measuring the frame age
+        self.frame_timestamp = None
+        # Smoothed period between published frames
+        self.frame_interval = 1.0 / 30
+        # Notified whenever a new frame is published or the stream stops
+        self.frame_ready = threading.Condition()
+        self.clients = {}
+        self.client_ids = itertools.count(1)
+        # Encoded variants of the current frame, keyed by (scale, quality)
+        self.variants = {}
+        self.variants_seq = 0
+        self.variants_lock = threading.Lock()
         self.stream = False
         self.port = port
         self.debug = debug
+        self.adaptive = adaptive
         self.video_stream = video_stream
-        self.app = Flask(__name__)
-        
-        @self.app.route('/' + self.video_stream)
+        # Streams served by this stream's server, including itself
+        self.shared_streams = [self]
+        route = '/' + self.video_stream.strip('/')
+
         def streaming():
-            return Response(self.generate_frame(), mimetype = "multipart/x-mixed-replace; boundary=frame")
-    
+            scale = min(max(request.args.get('scale', 1.0, type=float), 0.05), 1.0)
+            quality = min(max(request.args.get('quality', DEFAULT_JPEG_QUALITY, type=int), 1), 100)
+            max_fps = request.args.get('fps', 0.0, type=float)
+            return Response(self.generate_frame(scale, quality, max_fps), mimetype = "multipart/x-mixed-replace; boundary=frame")
+
+        def clients():
+            return jsonify(self.client_stats())
+
+        def metrics():
+            return Response(METRICS.prometheus({'stream_clients': sum(stream.client_count() for stream in self.shared_streams)}), mimetype='text/plain; version=0.0.4')
+
+        # Endpoints are named after the route, so several streams can share the app
+        self.app = app if app is not None else Flask(__name__)
+        self.app.add_url_rule(route, 'streaming' + route, streaming)
+        self.app.add_url_rule(route.rstrip('/') + '/clients', 'clients' + route, clients)
+        if app is None:
+            self.app.add_url_rule('/metrics', 'metrics', metrics)
+
+    def add_stream(self, video_stream: str):
+        # Stream on another route of the same server, started and stopped together with this one
+        stream = CameraStream(video_stream, self.port, self.debug, self.adaptive, app=self.app)
+        self.shared_streams.append(stream)
+        return stream
+
     def start(self):
-        self.stream = True
+        for stream in self.shared_streams:
+            stream.stream = True
         self.run()
-        
+
     def stop(self):
-        self.stream = False
-        self.frame_q.put(None)
+        for stream in self.shared_streams:
+            with stream.frame_ready:
+                stream.stream = False
+                stream.frame_ready.notify_all()
         self.app.do_teardown_appcontext()
         print('Stopping stream...')
-        
+
     def __del__(self):
         self.stop()
-        
+
     def run(self, host='0.0.0.0'):
         print('Streaming to host: %s:%s' % (host, self.port))
-        self.app.run(host=host, port=self.port)
-        
-    def generate_frame(self):
-        while self.stream:
-            with lock:
-                if self.frame_q.empty():
-                    continue
-                frame = self.frame_q.get()
-                
-            if frame is None:
-                break
-            
-            if self.debug:
-                print('Streaming')
-                
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')    
-        
-    def push_frame(self, frame):
-        with lock:
-            if self.frame_q.full():
-                self.frame_q.get()
-            self.frame_q.put(frame)
-            
-    
-            
\ No newline at end of file
+        self.app.run(host=host, port=self.port, threaded=True)
+
+    def generate_frame(self, scale: float = 1.0, quality: int = DEFAULT_JPEG_QUALITY, max_fps: float = 0.0):
+        client_id = next(self.client_ids)
+        client = {'sent': 0, 'dropped': 0, 'scale': scale, 'quality': quality, 'max_fps': max_fps}
+        last_seq = None
+        last_sent_time = 0.0
+        # Adaptation level, index into the ladder of variants starting with the requested one
+        ladder = self._variant_ladder(scale, quality)
+        level = 0
+        fast_writes = 0
+
+        with self.frame_ready:
+            self.clients[client_id] = client
+
+        try:
+            while self.stream:
+                if max_fps > 0:
+                    delay = last_sent_time + 1.0 / max_fps - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                with self.frame_ready:
+                    # Sleep until there is a frame this client has not seen yet
+                    self.frame_ready.wait_for(lambda: not self.stream or (self.frame is not None and self.frame_seq != last_seq))
+                    if not self.stream:
+                        break
+
+                    if last_seq is not None and self.frame_seq - last_seq > 1:
+                        client['dropped'] += self.frame_seq - last_seq - 1
+                        METRICS.increment('frames_dropped', self.frame_seq - last_seq - 1, reason='client_behind')
+                    last_seq = self.frame_seq
+                    frame, image, frame_seq, frame_timestamp = self.frame, self.image, self.frame_seq, self.frame_timestamp
+
+                variant_scale, variant_quality = ladder[level]
+                frame = self.get_variant(frame_seq, frame, image, variant_scale, variant_quality)
+                client['scale'], client['quality'] = variant_scale, variant_quality
+
+                if self.debug:
+                    print('Streaming')
+
+                write_start = time.monotonic()
+                # The generator resumes once the server has written the chunk to the socket.
+                # The frame is yielded on its own so the shared buffer is not copied per client.
+                yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\n'
+                yield frame
+                yield b'\r\n'
+                last_sent_time = time.monotonic()
+                client['sent'] += 1
+                METRICS.observe_stage('send', last_sent_time - write_start)
+                METRICS.increment('frames', event='sent')
+                if frame_timestamp is not None:
+                    # End to end, from the capture until the frame is written to this client
+                    METRICS.observe('frame_age_seconds', last_sent_time - frame_timestamp, point='sent')
+
+                if self.adaptive:
+                    level, fast_writes = self._adapt_level(level, len(ladder) - 1, fast_writes, last_sent_time - write_start, max_fps)
+        finally:
+            with self.frame_ready:
+                self.clients.pop(client_id, None)
+
+    def _adapt_level(self, level, max_level, fast_writes, write_time, max_fps):
+        # Budget for writing one frame, the client's own limit or the rate frames are published at
+        budget = max(1.0 / max_fps if max_fps > 0 else 0.0, self.frame_interval)
+
+        if write_time > budget:
+            return min(level + 1, max_level), 0
+
+        fast_writes += 1
+        # Step back up only after a run of writes that fit comfortably into the budget
+        if level > 0 and fast_writes >= 30 and write_time < budget / 2:
+            return level - 1, 0
+        return level, fast_writes
+
+    def _variant_ladder(self, scale, quality):
+        # Variants from the requested one down, lowering the quality first and then the resolution
+        ladder = [(scale, quality)]
+        ladder += [(scale, step) for step in ADAPTIVE_QUALITY_STEPS if step < quality]
+        ladder += [(step, ladder[-1][1]) for step in ADAPTIVE_SCALE_STEPS if step < scale]
+        return ladder
+
+    def get_variant(self, frame_seq, frame, image, scale, quality):
+        # Pushed encoded frame is the full resolution default quality variant
+        if image is None or (scale == 1.0 and quality == DEFAULT_JPEG_QUALITY):
+            return frame
+
+        key = (scale, quality)
+        with self.variants_lock:
+            if frame_seq > self.variants_seq:
+                self.variants = {}
+                self.variants_seq = frame_seq
+            # Frame replaced in the meantime is encoded without caching, nobody else will ask for it
+            entry = self.variants.setdefault(key, [threading.Lock(), None]) if frame_seq == self.variants_seq else [threading.Lock(), None]
+
+        # Only the first client asking for the variant encodes it, the others wait for the result
+        with entry[0]:
+            if entry[1] is None:
+                entry[1] = self.encode_variant(image, scale, quality)
+        # Fall back to the full frame if the variant failed to encode
+        return entry[1] if entry[1] is not None else frame
+
+    def encode_variant(self, image, scale, quality):
+        start_time = time.perf_counter()
+        if scale != 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        encoded_frame = encode_jpeg(image, quality)
+        METRICS.observe_stage('encode_variant', time.perf_counter() - start_time)
+        # The server only writes bytes, converted once and shared by the clients of the variant
+        return bytes(encoded_frame) if encoded_frame is not None else None
+
+    def push_frame(self, frame, image=None, timestamp: float = None):
+        # @frame: Encoded full resolution frame, @image: Source image used for encoding the smaller variants,
+        # @timestamp: time.monotonic() of the capture of the frame
+        if frame is None:
+            return
+
+        start_time = time.perf_counter()
+        # werkzeug only writes bytes, so the encoder's buffer is copied here once and the copy is shared by all clients
+        if not isinstance(frame, bytes):
+            frame = bytes(frame)
+
+        now = time.monotonic()
+        with self.frame_ready:
+            if self.frame_time is not None:
+                self.frame_interval = 0.9 * self.frame_interval + 0.1 * (now - self.frame_time)
+            self.frame_time = now
+            self.frame = frame
+            self.image = image
+            self.frame_timestamp = timestamp
+            self.frame_seq += 1
+            self.frame_ready.notify_all()
+
+        METRICS.observe_stage('push', time.perf_counter() - start_time)
+        METRICS.increment('frames', event='pushed')
+        if timestamp is not None:
+            METRICS.observe('frame_age_seconds', now - timestamp, point='pushed')
+
+    def client_count(self):
+        with self.frame_ready:
+            return len(self.clients)
+
+    def client_stats(self):
+        # Frames sent and dropped and the currently served variant of every connected client
+        with self.frame_ready:
+            return {client_id: dict(client) for client_id, client in self.clients.items()}
@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+
+from cam_reprojection import undistort_normalized
+
+'''
+Renderer of synthetic checkerboard images with known intrinsics, distortion and poses.
+Every output pixel is traced back through the distortion model to the board plane,
+so the rendered images follow the same camera model that cv2.calibrateCamera estimates.
+@checkerboard_size: Inner corners of the board (horizontal, vertical), as used by CameraCalibration
+@edge_length: Edge length of the squares
+@cam_mat: Ground truth camera matrix
+@dist_coeff: Ground truth distortion coefficients
+@image_size: (width, height) of the rendered images
+@pixels_per_square: Resolution of the board texture
+@noise: Standard deviation of the gaussian pixel noise
+'''
+class SyntheticCheckerboard:
+    def __init__(self, checkerboard_size, edge_length, cam_mat, dist_coeff, image_size, pixels_per_square: int = 64, noise: float = 2.0, seed: int = 0):
+        self.checkerboard_size = tuple(checkerboard_size)
+        self.edge_length = edge_length
+        self.cam_mat = np.asarray(cam_mat, dtype=np.float64)
+        self.dist_coeff = np.asarray(dist_coeff, dtype=np.float64).reshape(-1)
+        self.image_size = tuple(image_size)
+        self.pixels_per_square = pixels_per_square
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+
+        # Board points in the layout of CameraCalibration.objp
+        n_horizontal, n_vertical = self.checkerboard_size
+        self.objp = np.zeros((n_horizontal * n_vertical, 3), np.float32)
+        self.objp[:, :2] = np.mgrid[0:n_horizontal, 0:n_vertical].T.reshape(-1, 2) * edge_length
+
+        self.texture = self._board_texture()
+        self.normalized_grid = self._normalized_grid()
+
+    def _board_texture(self):
+        # Squares around the inner corners plus a white margin of one square on every side
+        n_horizontal, n_vertical = self.checkerboard_size
+        squares_x, squares_y = n_horizontal + 1, n_vertical + 1
+        size = self.pixels_per_square
+        texture = np.full(((squares_y + 2) * size, (squares_x + 2) * size), 255, np.uint8)
+        for row in range(squares_y):
+            for column in range(squares_x):
+                if (row + column) % 2 == 0:
+                    texture[(row + 1) * size:(row + 2) * size, (column + 1) * size:(column + 2) * size] = 0
+        return texture
+
+    def _normalized_grid(self):
+        # Undistorted normalized coordinates of every pixel, shared by all rendered views
+        width, height = self.image_size
+        u, v = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        # Distorted normalized coordinates, the camera matrix has no skew
+        y_distorted = (v - self.cam_mat[1, 2]) / self.cam_mat[1, 1]
+        x_distorted = (u - self.cam_mat[0, 2] - self.cam_mat[0, 1] * y_distorted) / self.cam_mat[0, 0]
+        x, y = undistort_normalized(x_distorted, y_distorted, self.dist_coeff)
+        return np.stack([x, y], axis=-1)
+
+    def random_pose(self, max_tilt_degrees: float = 35.0, margin: float = 0.05, attempts: int = 100):
+        # Pose with the whole board inside the frame, at a random position, distance and tilt
+        width, height = self.image_size
+        n_horizontal, n_vertical = self.checkerboard_size
+        board_centre = np.array([(n_horizontal - 1) * self.edge_length / 2, (n_vertical - 1) * self.edge_length / 2, 0.0])
+        board_width = (n_horizontal + 1) * self.edge_length
+
+        for _ in range(attempts):
+            tilt = np.radians(self.rng.uniform(-max_tilt_degrees, max_tilt_degrees, 2))
+            spin = np.radians(self.rng.uniform(-20, 20))
+            rotation, _ = cv2.Rodrigues(np.array([tilt[0], tilt[1], spin]))
+            # Board between 25 and 60 % of the frame width
+            distance = self.cam_mat[0, 0] * board_width / (width * self.rng.uniform(0.25, 0.6))
+            centre = np.array([self.rng.uniform(-0.3, 0.3) * distance * width / self.cam_mat[0, 0],
+                               self.rng.uniform(-0.3, 0.3) * distance * height / self.cam_mat[1, 1],
+                               distance])
+            tvec = centre - rotation @ board_centre
+            rvec = cv2.Rodrigues(rotation)[0].reshape(3)
+
+            corners = self.project(rvec, tvec)
+            outer = self.edge_length * np.array([[-1, -1, 0], [n_horizontal, -1, 0], [n_horizontal, n_vertical, 0], [-1, n_vertical, 0]], np.float64)
+            outer_pixels = cv2.projectPoints(outer, rvec, tvec, self.cam_mat, self.dist_coeff)[0].reshape(-1, 2)
+            inside = np.all((outer_pixels >= [margin * width, margin * height]) & (outer_pixels <= [(1 - margin) * width, (1 - margin) * height]))
+            if inside and np.all(np.isfinite(corners)):
+                return rvec, tvec
+
+        raise ValueError('No pose with the board inside the frame found.')
+
+    def project(self, rvec, tvec):
+        # Ground truth corner positions in pixels, (corners, 2)
+        return cv2.projectPoints(self.objp.astype(np.float64), rvec, tvec, self.cam_mat, self.dist_coeff)[0].reshape(-1, 2)
+
+    def render(self, rvec, tvec):
+        # Gray image of the board seen from the pose, with the ground truth corners
+        rotation = cv2.Rodrigues(np.asarray(rvec, dtype=np.float64))[0]
+        # Homography from the board plane to normalized image coordinates and its inverse
+        homography = np.column_stack([rotation[:, 0], rotation[:, 1], np.asarray(tvec, dtype=np.float64).reshape(3)])
+        inverse = np.linalg.inv(homography)
+
+        x = self.normalized_grid[..., 0]
+        y = self.normalized_grid[..., 1]
+        w = inverse[2, 0] * x + inverse[2, 1] * y + inverse[2, 2]
+        board_x = (inverse[0, 0] * x + inverse[0, 1] * y + inverse[0, 2]) / w
+        board_y = (inverse[1, 0] * x + inverse[1, 1] * y + inverse[1, 2]) / w
+
+        # Board coordinates to texture pixels, the first inner corner sits two squares into the texture
+        scale = self.pixels_per_square / self.edge_length
+        map_x = (board_x * scale + 2 * self.pixels_per_square - 0.5).astype(np.float32)
+        map_y = (board_y * scale + 2 * self.pixels_per_square - 0.5).astype(np.float32)
+        image = cv2.remap(self.texture, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=160)
+
+        # Mild optical blur and sensor noise
+        image = cv2.GaussianBlur(image, (0, 0), 0.8)
+        if self.noise > 0:
+            image = np.clip(image + self.rng.normal(0, self.noise, image.shape), 0, 255).astype(np.uint8)
+
+        return image, self.project(rvec, tvec)
+
+    def render_views(self, n_views: int):
+        # List of (image, corners, rvec, tvec)
+        views = []
+        for _ in range(n_views):
+            rvec, tvec = self.random_pose()
+            image, corners = self.render(rvec, tvec)
+            views.append((image, corners, rvec, tvec))
+        return views
+
+def default_camera(image_size):
+    # Ground truth resembling a wide angle CSI camera, scaled to the image size
+    width, height = image_size
+    cam_mat = np.array([[0.9 * width, 0, width / 2 + 0.01 * width],
+                        [0, 0.9 * width, height / 2 - 0.01 * height],
+                        [0, 0, 1]], dtype=np.float64)
+    dist_coeff = np.array([-0.28, 0.09, 0.0008, -0.0005, -0.01])
+    return cam_mat, dist_coeff
@@ -0,0 +1,58 @@
+import numpy as np
+
+'''
+Search region tracking of the checkerboard between consecutive live frames.
+After a detection the next search is limited to the bounding box of the corners padded on every side,
+the corners found in the crop are shifted back to full frame coordinates by the caller.
+After a miss in the region the caller searches the same frame in full, so an outdated region costs one crop search.
+After a miss, or once @refresh_interval searches ran in a tracked region, the next search covers the whole frame.
+@padding: Padding on every side as a fraction of the board bounding box size
+@min_padding: Smallest padding in pixels, keeps the outer squares of small boards inside the crop
+@refresh_interval: Number of tracked searches before a full frame search is forced (0 - only after a miss)
+'''
+class BoardTracker:
+    def __init__(self, padding: float = 0.5, min_padding: int = 32, refresh_interval: int = 30):
+        self.padding = padding
+        self.min_padding = min_padding
+        self.refresh_interval = refresh_interval
+        # (x, y, width, height) of the last detection in full frame pixels, None when lost
+        self.box = None
+        self.image_size = None
+        self.tracked_searches = 0
+
+    def search_region(self, image_size):
+        # (x, y, width, height) of the crop to search, None for a full frame search
+        image_size = tuple(image_size)
+        if self.box is None or image_size != self.image_size:
+            return None
+        if self.refresh_interval > 0 and self.tracked_searches >= self.refresh_interval:
+            return None
+
+        width, height = image_size
+        box_x, box_y, box_width, box_height = self.box
+        padding_x = max(self.padding * box_width, self.min_padding)
+        padding_y = max(self.padding * box_height, self.min_padding)
+        x = int(max(box_x - padding_x, 0))
+        y = int(max(box_y - padding_y, 0))
+        right = int(min(np.ceil(box_x + box_width + padding_x), width))
+        bottom = int(min(np.ceil(box_y + box_height + padding_y), height))
+        return x, y, right - x, bottom - y
+
+    def update(self, corners, image_size, tracked: bool):
+        # Result of the last search, @corners in full frame pixels or None on a miss,
+        # @tracked: Whether the search ran in the region returned by search_region
+        self.image_size = tuple(image_size)
+        if corners is None:
+            self.reset()
+            return
+
+        corners = np.asarray(corners).reshape(-1, 2)
+        top_left = corners.min(axis=0)
+        bottom_right = corners.max(axis=0)
+        self.box = (float(top_left[0]), float(top_left[1]), float(bottom_right[0] - top_left[0]), float(bottom_right[1] - top_left[1]))
+        self.tracked_searches = self.tracked_searches + 1 if tracked else 0
+
+    def reset(self):
+        # The board may have moved anywhere, the next search covers the full frame
+        self.box = None
+        self.tracked_searches = 0
@@ -0,0 +1,265 @@
+import cv2
+import numpy as np
+import hashlib
+import os
+
+from cam_metrics import METRICS
+from cam_reprojection import distort_normalized, undistort_normalized
+
+# Largest deviation in pixels of the grid lookup from the solver that build_grid accepts
+GRID_MAX_ERROR = 0.02
+
+'''
+Undistortion engine based on precomputed rectify maps.
+The maps are built once per (camera matrix, distortion, resolution, alpha) and reused
+for every frame with cv2.remap. Maps are stored in compact fixed-point form (CV_16SC2 + CV_16UC1)
+and persisted to disk so the next start does not need to rebuild them.
+@cache_dir: Directory for persisting the maps, maps are kept in memory only if empty
+@alpha: Free scaling parameter passed to getOptimalNewCameraMatrix (0 - only valid pixels, 1 - all source pixels)
+@interpolation: Interpolation used by cv2.remap
+@debug: Flag to enable debug prints
+'''
+class UndistortionEngine:
+    map_file_prefix = 'undistort_maps_'
+
+    def __init__(self, cache_dir: str = '', alpha: float = 1.0, interpolation: int = cv2.INTER_LINEAR, debug: bool = False):
+        self.cache_dir = cache_dir
+        self.alpha = alpha
+        self.interpolation = interpolation
+        self.debug = debug
+
+        self.cam_mat = None
+        self.dist_coeff = None
+        self.newcammat = None
+        self.roi = None
+        self.size = None
+        self.key = None
+        self.map1 = None
+        self.map2 = None
+
+    def configure(self, cam_mat, dist_coeff, width: int, height: int, alpha: float = None):
+        if alpha is not None:
+            self.alpha = alpha
+
+        self.cam_mat = np.asarray(cam_mat, dtype=np.float64).reshape(3, 3)
+        self.dist_coeff = np.asarray(dist_coeff, dtype=np.float64).reshape(1, -1)
+        self._prepare((width, height))
+
+    def is_configured(self):
+        return self.cam_mat is not None and self.dist_coeff is not None
+
+    def undistort(self, frame):
+        if frame is None or not self.is_configured():
+            return None
+
+        height, width = frame.shape[:2]
+        # Rebuild only when the resolution of the incoming frames changes
+        if self.size != (width, height):
+            self._prepare((width, height))
+
+        with METRICS.timed('undistort'):
+            return cv2.remap(frame, self.map1, self.map2, self.interpolation)
+
+    def _prepare(self, size):
+        key = self._make_key(size)
+        if key == self.key:
+            return
+
+        self.newcammat, self.roi = cv2.getOptimalNewCameraMatrix(self.cam_mat, self.dist_coeff, size, self.alpha, size)
+
+        if not self._load_maps(key, size):
+            if self.debug:
+                print('UNDISTORT: Building rectify maps for %dx%d.' % size)
+            self.map1, self.map2 = cv2.initUndistortRectifyMap(self.cam_mat, self.dist_coeff, None, self.newcammat, size, cv2.CV_16SC2)
+            self._save_maps(key)
+
+        self.size = size
+        self.key = key
+
+    def _make_key(self, size):
+        digest = hashlib.sha1()
+        digest.update(self.cam_mat.tobytes())
+        digest.update(self.dist_coeff.tobytes())
+        digest.update(np.array([size[0], size[1], self.alpha], dtype=np.float64).tobytes())
+        return digest.hexdigest()[:16]
+
+    def _map_file_path(self, key):
+        return os.path.join(self.cache_dir, self.map_file_prefix + key + '.npz')
+
+    def _load_maps(self, key, size):
+        if not self.cache_dir:
+            return False
+
+        map_file_path = self._map_file_path(key)
+        if not os.path.exists(map_file_path):
+            return False
+
+        try:
+            with np.load(map_file_path) as maps:
+                map1 = maps['map1']
+                map2 = maps['map2']
+        except (OSError, KeyError, ValueError) as e:
+            print('UNDISTORT: Failed to load cached maps, rebuilding. %s' % e)
+            return False
+
+        if map1.shape[:2] != (size[1], size[0]) or map2.shape != (size[1], size[0]):
+            return False
+
+        if self.debug:
+            print('UNDISTORT: Loaded cached rectify maps from %s' % map_file_path)
+        self.map1, self.map2 = map1, map2
+        return True
+
+    def _save_maps(self, key):
+        if not self.cache_dir:
+            return
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Maps of older calibrations or resolutions are no longer needed
+            for file in os.listdir(self.cache_dir):
+                if file.startswith(self.map_file_prefix):
+                    os.remove(os.path.join(self.cache_dir, file))
+            np.savez(self._map_file_path(key), map1=self.map1, map2=self.map2)
+        except OSError as e:
+            print('UNDISTORT: Failed to persist rectify maps. %s' % e)
+
+'''
+Point level undistortion for keypoints, without undistorting the whole frame.
+Pixel coordinates of the distorted image are mapped to undistorted normalized coordinates, or to pixels of
+@new_cam_mat, in one vectorized call. By default the same fixed-point iteration as cv2.undistortPoints is solved per point.
+After build_grid() points inside the image are instead looked up with bilinear interpolation in an inverse distortion grid
+sampled every grid_step pixels, at a constant cost per point. Points outside the grid are solved iteratively.
+The interpolation error grows with the distortion and shrinks with the focal length in pixels, so build_grid
+halves the step until grid_accuracy() is within GRID_MAX_ERROR pixels.
+@cam_mat: Camera matrix of the calibration
+@dist_coeff: Distortion coefficients of the calibration
+@new_cam_mat: Camera matrix of the returned pixel coordinates, e.g. the one of the undistorted frame (defaults to @cam_mat)
+@iterations: Fixed-point iterations of the solver
+'''
+class PointUndistorter:
+    def __init__(self, cam_mat, dist_coeff, new_cam_mat=None, iterations: int = 20):
+        self.cam_mat = np.asarray(cam_mat, dtype=np.float64).reshape(3, 3)
+        self.dist_coeff = np.asarray(dist_coeff, dtype=np.float64).reshape(-1)
+        self.new_cam_mat = self.cam_mat if new_cam_mat is None else np.asarray(new_cam_mat, dtype=np.float64).reshape(3, 3)
+        self.iterations = iterations
+        # Undistorted normalized coordinates at pixels (column * grid_step, row * grid_step), see build_grid
+        self.grid_x = None
+        self.grid_y = None
+        self.grid_step = None
+        self.image_size = None
+
+    def build_grid(self, image_size, grid_step: int = None, max_error: float = GRID_MAX_ERROR, max_grid_step: int = 16):
+        '''
+        Samples the inverse distortion over an image of @image_size (width, height).
+        @grid_step: Fixed step of the grid in pixels, by default derived from the distortion
+        @max_error: Without @grid_step the step starts at @max_grid_step and is halved until the grid error is below this
+        Returns the grid_accuracy() of the built grid, None with a fixed @grid_step.
+        '''
+        if grid_step is not None:
+            self._sample_grid(image_size, grid_step)
+            return None
+
+        grid_step = max_grid_step
+        while True:
+            self._sample_grid(image_size, grid_step)
+            accuracy = self.grid_accuracy()
+            if accuracy['max'] <= max_error or grid_step == 1:
+                return accuracy
+            grid_step //= 2
+
+    def _sample_grid(self, image_size, grid_step):
+        # Grid extended to whole cells
+        width, height = image_size
+        columns = int(np.ceil((width - 1) / grid_step)) + 1
+        rows = int(np.ceil((height - 1) / grid_step)) + 1
+        pixel_x, pixel_y = np.meshgrid(np.arange(columns, dtype=np.float64) * grid_step, np.arange(rows, dtype=np.float64) * grid_step)
+        self.grid_x, self.grid_y = self._solve(pixel_x, pixel_y)
+        self.grid_step = grid_step
+        self.image_size = (width, height)
+
+    def undistort_points(self, points, normalized: bool = False, use_grid: bool = True):
+        '''
+        @points: (N, 2) pixel coordinates of the distorted image, anything reshapeable to it
+        @normalized: Return normalized coordinates (x/z, y/z) instead of pixels of new_cam_mat
+        @use_grid: Look the points up in the grid if one was built
+        Returns (N, 2) float64 coordinates.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        with METRICS.timed('undistort_points'):
+            if use_grid and self.grid_x is not None:
+                x, y = self._lookup(points[:, 0], points[:, 1])
+            else:
+                x, y = self._solve(points[:, 0], points[:, 1])
+
+            if normalized:
+                return np.stack([x, y], axis=1)
+            return np.stack([self.new_cam_mat[0, 0] * x + self.new_cam_mat[0, 1] * y + self.new_cam_mat[0, 2],
+                             self.new_cam_mat[1, 1] * y + self.new_cam_mat[1, 2]], axis=1)
+
+    def grid_accuracy(self, n_points: int = 10000, seed: int = 0):
+        '''
+        Compares the grid lookup with the iterative solver on random points of the image and on the cell centres,
+        where the bilinear interpolation is worst. Errors are in pixels of new_cam_mat.
+        The solver residual is the distance between the points and their undistorted result distorted again.
+        Returns dictionary with rms, max and p99 of the grid error and the max solver residual.
+        '''
+        if self.grid_x is None:
+            print('UNDISTORT: No grid built, call build_grid first.')
+            return None
+        width, height = self.image_size
+        random_points = np.random.default_rng(seed).uniform((0, 0), (width - 1, height - 1), (n_points, 2))
+        centre_x, centre_y = np.meshgrid(np.arange(self.grid_step / 2, width - 1, self.grid_step), np.arange(self.grid_step / 2, height - 1, self.grid_step))
+        points = np.concatenate([random_points, np.stack([centre_x.ravel(), centre_y.ravel()], axis=1)])
+
+        grid_points = self.undistort_points(points, use_grid=True)
+        solved_points = self.undistort_points(points, use_grid=False)
+        errors = np.linalg.norm(grid_points - solved_points, axis=1)
+
+        normalized = self.undistort_points(points, normalized=True, use_grid=False)
+        x_distorted, y_distorted = distort_normalized(normalized[:, 0], normalized[:, 1], self.dist_coeff)
+        redistorted = np.stack([self.cam_mat[0, 0] * x_distorted + self.cam_mat[0, 1] * y_distorted + self.cam_mat[0, 2],
+                                self.cam_mat[1, 1] * y_distorted + self.cam_mat[1, 2]], axis=1)
+
+        return {
+            'points': len(points),
+            'rms': float(np.sqrt(np.mean(errors ** 2))),
+            'max': float(errors.max()),
+            'p99': float(np.percentile(errors, 99)),
+            'solver_residual_max': float(np.linalg.norm(redistorted - points, axis=1).max()),
+        }
+
+    def _solve(self, pixel_x, pixel_y):
+        # Iterative inverse of the distortion, undistorted normalized coordinates
+        if len(self.dist_coeff) > 12:
+            # Tilted sensor model is not vectorized, leave it to OpenCV
+            points = np.stack([np.ravel(pixel_x), np.ravel(pixel_y)], axis=1).reshape(-1, 1, 2)
+            normalized = cv2.undistortPoints(points, self.cam_mat, self.dist_coeff).reshape(-1, 2)
+            return normalized[:, 0].reshape(np.shape(pixel_x)), normalized[:, 1].reshape(np.shape(pixel_y))
+
+        y_distorted = (pixel_y - self.cam_mat[1, 2]) / self.cam_mat[1, 1]
+        x_distorted = (pixel_x - self.cam_mat[0, 2] - self.cam_mat[0, 1] * y_distorted) / self.cam_mat[0, 0]
+        return undistort_normalized(x_distorted, y_distorted, self.dist_coeff, self.iterations)
+
+    def _lookup(self, pixel_x, pixel_y):
+        # Bilinear interpolation in the grid, points outside of it are solved
+        column = pixel_x / self.grid_step
+        row = pixel_y / self.grid_step
+        rows, columns = self.grid_x.shape
+        inside = (column >= 0) & (row >= 0) & (column <= columns - 1) & (row <= rows - 1)
+
+        column_0 = np.minimum(np.floor(column[inside]).astype(np.intp), columns - 2)
+        row_0 = np.minimum(np.floor(row[inside]).astype(np.intp), rows - 2)
+        t_x = column[inside] - column_0
+        t_y = row[inside] - row_0
+
+        x = np.empty_like(pixel_x)
+        y = np.empty_like(pixel_y)
+        for grid, result in ((self.grid_x, x), (self.grid_y, y)):
+            top = grid[row_0, column_0] * (1 - t_x) + grid[row_0, column_0 + 1] * t_x
+            bottom = grid[row_0 + 1, column_0] * (1 - t_x) + grid[row_0 + 1, column_0 + 1] * t_x
+            result[inside] = top * (1 - t_y) + bottom * t_y
+
+        if not inside.all():
+            x[~inside], y[~inside] = self._solve(pixel_x[~inside], pixel_y[~inside])
+        return x, y
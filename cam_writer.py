@@ -0,0 +1,140 @@
+import cv2
+import os
+import threading
+import time
+from collections import deque
+
+from cam_metrics import METRICS
+
+# Encoding parameters of the supported formats, png is lossless and bmp stores the raw pixels
+IMAGE_FORMATS = {
+    'jpg': [cv2.IMWRITE_JPEG_QUALITY, 95, cv2.IMWRITE_JPEG_OPTIMIZE, 1],
+    'png': [cv2.IMWRITE_PNG_COMPRESSION, 1],
+    'bmp': [],
+}
+
+'''
+Background image writer, save() only queues the frame and returns, encoding and writing happen on a worker thread.
+Captured frames are never modified after they are published, so the queued reference is a snapshot of the frame.
+Every image is written to a temporary file, flushed to disk with fsync and renamed,
+so a crash never leaves a truncated image behind.
+@directory: Directory the images are written to
+@image_format: jpg, png (lossless) or bmp (uncompressed), see IMAGE_FORMATS
+@max_queue: Frames waiting to be written before save() rejects new ones
+@fsync: Flush every image to disk before it counts as written
+'''
+class ImageWriter:
+    def __init__(self, directory: str, image_format: str = 'jpg', max_queue: int = 64, fsync: bool = True):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError('Unsupported image format %s, use one of %s.' % (image_format, ', '.join(IMAGE_FORMATS)))
+        self.directory = directory
+        self.image_format = image_format
+        self.max_queue = max_queue
+        self.fsync = fsync
+        self.queue = deque()
+        self.queued = 0
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.started = time.monotonic()
+        self.running = True
+        # Guards the queue and the counters, notified when a frame is queued or written
+        self.queue_changed = threading.Condition()
+        self.thread = threading.Thread(target=self._work, daemon=True)
+        self.thread.start()
+
+    def save(self, image, name: str):
+        # Queue @image to be written as <name>.<image_format>, returns the path or None if the queue is full
+        if image is None:
+            return None
+        image_path = os.path.join(self.directory, '%s.%s' % (name, self.image_format))
+        with self.queue_changed:
+            if len(self.queue) >= self.max_queue or not self.running:
+                self.rejected += 1
+                METRICS.increment('frames_dropped', reason='writer_full')
+                return None
+            self.queue.append((image, image_path))
+            self.queued += 1
+            self.queue_changed.notify_all()
+        return image_path
+
+    def queue_depth(self):
+        with self.queue_changed:
+            return len(self.queue)
+
+    def flush(self, timeout: float = None):
+        # Block until every queued frame is written, False on timeout
+        with self.queue_changed:
+            return self.queue_changed.wait_for(lambda: self.written + self.failed == self.queued, timeout)
+
+    def stop(self):
+        # Writes the remaining queue before returning
+        with self.queue_changed:
+            self.running = False
+            self.queue_changed.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        with self.queue_changed:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return {
+                'written': self.written,
+                'queue_depth': len(self.queue),
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'megabytes_per_second': self.bytes_written / elapsed / 1e6,
+                'images_per_second': self.written / elapsed,
+                # Throughput of the worker while it is busy, the limit of a burst
+                'write_megabytes_per_second': self.bytes_written / max(self.write_seconds, 1e-9) / 1e6,
+            }
+
+    def summary(self):
+        stats = self.stats()
+        return 'WRITER: %d written, %d queued, %d failed, %d rejected, %.1f MB/s (%.1f MB/s while writing)' % (
+            stats['written'], stats['queue_depth'], stats['failed'], stats['rejected'], stats['megabytes_per_second'], stats['write_megabytes_per_second'])
+
+    def _work(self):
+        while True:
+            with self.queue_changed:
+                self.queue_changed.wait_for(lambda: self.queue or not self.running)
+                if not self.queue:
+                    return
+                image, image_path = self.queue[0]
+
+            start_time = time.perf_counter()
+            size = self._write(image, image_path)
+            duration = time.perf_counter() - start_time
+            METRICS.observe_stage('write_image', duration)
+
+            with self.queue_changed:
+                self.queue.popleft()
+                if size is None:
+                    self.failed += 1
+                else:
+                    self.written += 1
+                    self.bytes_written += size
+                    self.write_seconds += duration
+                    METRICS.increment('frames', event='saved')
+                self.queue_changed.notify_all()
+
+    def _write(self, image, image_path):
+        # Size of the written file, None on failure
+        success_encode, encoded_image = cv2.imencode('.' + self.image_format, image, IMAGE_FORMATS[self.image_format])
+        if not success_encode:
+            print('WRITER: Could not encode %s.' % image_path)
+            return None
+
+        temporary_path = image_path + '.tmp'
+        try:
+            with open(temporary_path, 'wb') as image_file:
+                image_file.write(encoded_image.data)
+                if self.fsync:
+                    image_file.flush()
+                    os.fsync(image_file.fileno())
+            os.replace(temporary_path, image_path)
+        except OSError as e:
+            print('WRITER: Could not write %s (%s).' % (image_path, e))
+            return None
+        return encoded_image.nbytes
@@ -1,7 +1,12 @@
 import os
+import argparse
 from cam_capture import CameraCapture
+from cam_source import open_frame_source, CaptureProcess
 from cam_stream import CameraStream
 from cam_calib import CameraCalibration
+from cam_encoder import FrameEncoder
+from cam_metrics import METRICS, MetricsReporter
+from cam_scheduler import FrameScheduler
 import threading
 import time
 import sys
@@ -37,7 +42,19 @@ def create_gstreamer_pipeline(
         )
     )
 
+def run_arguments():
+    parser = argparse.ArgumentParser(description='Stream the undistorted camera footage.')
+    parser.add_argument('--sensor', type=int, help='Camera sensor id, loads the calibration from calib_data/sensor_<id> saved by cam_script.py --sensors.')
+    parser.add_argument('--source', type=str, default='camera', help='Frame source: camera, synthetic, a directory with images or a video file.')
+    parser.add_argument('--fps', type=float, help='Replay rate of a non camera source (0 - as fast as possible), defaults to the native rate of a video file and 30 otherwise.')
+    parser.add_argument('--loop', help='Start a video file or image directory source over when it ends.', action='store_true')
+    parser.add_argument('--capture_process', help='Capture in a separate process that hands the frames over through shared memory.', action='store_true')
+    parser.add_argument('--metrics_interval', type=float, default=0, help='Print a summary of the pipeline latencies every this many seconds (0 - off).')
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = run_arguments()
+    
     # Path for calibration results
     file_dir_path = os.path.abspath(os.path.dirname(__file__))
     
@@ -45,16 +62,27 @@ if __name__ == "__main__":
     cam_calib = CameraCalibration() 
     
     # Read calibration data
-    cam_calib.get_new_cam_matrix(os.path.join(file_dir_path, 'calib_data'))
+    calib_data_path = os.path.join(file_dir_path, 'calib_data')
+    if args.sensor is not None:
+        calib_data_path = os.path.join(calib_data_path, 'sensor_%d' % args.sensor)
+    cam_calib.get_new_cam_matrix(calib_data_path)
       
     # Create GStreamer pipeline
-    g_pipe = create_gstreamer_pipeline()
+    g_pipe = create_gstreamer_pipeline(sensor_id=args.sensor or 0)
 
-    # Create Camera capture object
-    cam_cap = CameraCapture(g_pipe)
+    # Create Camera capture object, reading from the camera or a replayed source
+    source_args = dict(source=args.source, gstreamer_str=g_pipe, fps=args.fps, loop=args.loop, image_size=(WIDTH, HEIGHT))
+    if args.capture_process:
+        frame_source = CaptureProcess(source_args, max_frame_shape=(HEIGHT, WIDTH, 3)).frame_source()
+    else:
+        frame_source = open_frame_source(**source_args)
+    cam_cap = CameraCapture(g_pipe, frame_source=frame_source)
     
     # Create streaming object
     cam_stream = CameraStream()
+    
+    # Create encoder that pushes the encoded frames to the stream
+    frame_encoder = FrameEncoder(cam_stream.push_frame)
       
     # Start camera streaming
     # Create a thread and attach the method that captures the image frames, to it
@@ -65,24 +93,24 @@ if __name__ == "__main__":
     stream_thread.start()
     capturing_thread.start()
     
-    # Collect enough images
-    while True:
-        try:
-            original_frame = cam_cap.latest_frame()
-
-            undistorted_frame = cam_calib.undistortion(original_frame)
+    if args.metrics_interval > 0:
+        MetricsReporter(METRICS, args.metrics_interval).start()
+    
+    # Undistort every new frame once, waiting for the camera in between
+    scheduler = FrameScheduler(cam_cap)
+    try:
+        for captured_frame in scheduler:
+            undistorted_frame = cam_calib.undistortion(captured_frame.image)
             
-            if undistorted_frame is not None:
-                frame = cam_cap.encode_frame(frame=undistorted_frame)
-            else:
-                frame = cam_cap.encode_frame(frame=original_frame)
+            if undistorted_frame is None:
+                undistorted_frame = captured_frame.image
             
-            cam_stream.push_frame(frame) 
-
-    # Perform calibration                
-        except KeyboardInterrupt:
-            cam_cap.stop()
-            cam_stream.stop()
-            sys.exit(0)
-
-                
\ No newline at end of file
+            frame_encoder.submit(undistorted_frame, captured_frame.seq, captured_frame.timestamp)
+    except KeyboardInterrupt:
+        pass
+    
+    # Capture stopped or interrupted
+    cam_cap.stop()
+    frame_encoder.stop()
+    cam_stream.stop()
+    sys.exit(0)
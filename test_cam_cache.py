@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+
+import cam_cache
+from cam_cache import DetectionCache, detection_key
+
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+def _write_image(path, value):
+    cv2.imwrite(str(path), np.full((32, 48), value, np.uint8))
+
+def test_cached_detection_survives_reload(tmp_path):
+    image_path = str(tmp_path / 'view.png')
+    _write_image(image_path, 10)
+    key = detection_key((6, 8), CRITERIA, {'pyramid_levels': 0, 'flags': None})
+    corners = np.arange(96, dtype=np.float32).reshape(48, 1, 2)
+
+    cache = DetectionCache(str(tmp_path / 'detections.cache'))
+    assert cache.get(image_path, key) is None
+    cache.put(image_path, key, True, corners, (48, 32))
+    cache.save()
+
+    ret, cached_corners, image_size = DetectionCache(str(tmp_path / 'detections.cache')).get(image_path, key)
+    assert ret and image_size == (48, 32)
+    assert cached_corners.shape == corners.shape
+    assert np.array_equal(cached_corners, corners)
+
+def test_changed_content_or_settings_miss(tmp_path, monkeypatch):
+    image_path = str(tmp_path / 'view.png')
+    _write_image(image_path, 10)
+    key = detection_key((6, 8), CRITERIA, {'pyramid_levels': 0, 'flags': None})
+    cache = DetectionCache(str(tmp_path / 'detections.cache'))
+    cache.put(image_path, key, False, None, (48, 32))
+    assert cache.get(image_path, key) == (False, None, (48, 32))
+
+    assert cache.get(image_path, detection_key((6, 8), CRITERIA, {'pyramid_levels': 1, 'flags': None})) is None
+    monkeypatch.setattr(cam_cache, 'DETECTION_CACHE_VERSION', cam_cache.DETECTION_CACHE_VERSION + 1)
+    assert cache.get(image_path, detection_key((6, 8), CRITERIA, {'pyramid_levels': 0, 'flags': None})) is None
+
+    _write_image(image_path, 200)
+    assert cache.get(image_path, key) is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    key = detection_key((6, 8), CRITERIA, {})
+    corners = np.zeros((48, 1, 2), np.float32)
+    cache = DetectionCache(str(tmp_path / 'detections.cache'), max_bytes=2 * (cam_cache.ENTRY_OVERHEAD_BYTES + corners.nbytes))
+    image_paths = [str(tmp_path / ('view_%d.png' % index)) for index in range(3)]
+    for value, image_path in enumerate(image_paths):
+        _write_image(image_path, value)
+        cache.put(image_path, key, True, corners, (48, 32))
+    cache.get(image_paths[0], key)
+    cache.save()
+
+    cache = DetectionCache(str(tmp_path / 'detections.cache'))
+    assert [cache.get(image_path, key) is not None for image_path in image_paths] == [True, False, True]
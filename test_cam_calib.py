@@ -0,0 +1,34 @@
+import cv2
+import numpy as np
+
+import cam_calib
+from cam_calib import detect_corners, find_corners, DETECTION_FLAGS, PYRAMID_DETECTION_FLAGS, PYRAMID_DETECTION_TOLERANCE
+from cam_synthetic import SyntheticCheckerboard, default_camera
+from cam_benchmark import corner_errors_to_truth
+
+CHECKERBOARD_SIZE = (6, 8)
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+def _recorded_flags(monkeypatch, **find_args):
+    recorded = []
+    def find_chessboard_corners(image, pattern_size, corners=None, flags=None):
+        recorded.append((corners, flags))
+        return False, None
+    monkeypatch.setattr(cam_calib.cv2, 'findChessboardCorners', find_chessboard_corners)
+    find_corners(np.zeros((64, 64), np.uint8), CHECKERBOARD_SIZE, **find_args)
+    return recorded
+
+def test_detection_flags_reach_opencv(monkeypatch):
+    assert _recorded_flags(monkeypatch) == [(None, DETECTION_FLAGS)]
+    assert _recorded_flags(monkeypatch, pyramid_levels=1) == [(None, PYRAMID_DETECTION_FLAGS)]
+    assert _recorded_flags(monkeypatch, flags=cv2.CALIB_CB_FAST_CHECK) == [(None, cv2.CALIB_CB_FAST_CHECK)]
+
+def test_pyramid_detection_agrees_with_full_resolution():
+    image_size = (1280, 720)
+    cam_mat, dist_coeff = default_camera(image_size)
+    board = SyntheticCheckerboard(CHECKERBOARD_SIZE, 0.108, cam_mat, dist_coeff, image_size, seed=1)
+    for image, _, _, _ in board.render_views(3):
+        ret, corners = detect_corners(image, CHECKERBOARD_SIZE, CRITERIA)
+        pyramid_ret, pyramid_corners = detect_corners(image, CHECKERBOARD_SIZE, CRITERIA, pyramid_levels=1)
+        assert ret and pyramid_ret
+        assert corner_errors_to_truth(pyramid_corners.reshape(-1, 2), corners.reshape(-1, 2)).max() < PYRAMID_DETECTION_TOLERANCE
@@ -0,0 +1,32 @@
+import numpy as np
+
+from cam_capture import CameraCapture
+
+class FlakySource:
+    # Fails the reads listed in @failures, ends after @length reads
+    def __init__(self, failures, length):
+        self.failures = set(failures)
+        self.length = length
+        self.reads = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        self.reads += 1
+        if self.reads in self.failures or self.reads > self.length:
+            return False, None
+        return True, np.full((4, 4, 3), self.reads, np.uint8)
+
+    def release(self):
+        pass
+
+def test_single_failed_reads_are_retried():
+    source = FlakySource(failures=[2, 5, 6], length=10)
+    capture = CameraCapture(frame_source=source, max_failed_reads=3)
+    capture.capturing()
+    # Seven good frames, the capture stops after three failed reads in a row past the end
+    assert capture.frame_seq == 7
+    assert capture.latest_frame()[0, 0, 0] == 10
+    assert source.reads == 13
+    assert not capture.running
@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+from cam_coverage import ViewSelector, TILT_NAMES
+
+CHECKERBOARD_SIZE = (6, 8)
+IMAGE_SIZE = (640, 480)
+CAM_MAT = np.array([[600.0, 0, 320], [0, 600, 240], [0, 0, 1]])
+
+def _board_corners(yaw_degrees=0.0, pitch_degrees=0.0, distance=2.0):
+    # Corners in detection order of a board centred in front of the camera, turned by yaw and pitch around its centre
+    n_horizontal, n_vertical = CHECKERBOARD_SIZE
+    objp = np.zeros((n_horizontal * n_vertical, 3))
+    objp[:, :2] = np.mgrid[0:n_horizontal, 0:n_vertical].T.reshape(-1, 2) * 0.108
+    centre = objp.mean(axis=0)
+    rvec = np.radians([pitch_degrees, yaw_degrees, 0.0])
+    tvec = np.array([0.0, 0.0, distance]) - cv2.Rodrigues(rvec)[0] @ centre
+    return cv2.projectPoints(objp, rvec, tvec, CAM_MAT, None)[0].reshape(-1, 2)
+
+def test_reversed_detection_gives_the_same_bin():
+    view_selector = ViewSelector(CHECKERBOARD_SIZE)
+    for yaw, pitch in ((0, 0), (35, 0), (-35, 0), (0, 35), (0, -35)):
+        corners = _board_corners(yaw, pitch)
+        assert view_selector.view_key(corners, IMAGE_SIZE) == view_selector.view_key(corners[::-1], IMAGE_SIZE)
+
+def test_tilts_fall_into_different_bins():
+    view_selector = ViewSelector(CHECKERBOARD_SIZE)
+    tilts = {view_selector.view_key(_board_corners(yaw, pitch), IMAGE_SIZE)[3] for yaw, pitch in ((0, 0), (35, 0), (-35, 0), (0, 35), (0, -35))}
+    assert tilts == set(range(len(TILT_NAMES)))
+
+def test_full_bin_rejects_redundant_views():
+    view_selector = ViewSelector(CHECKERBOARD_SIZE, max_views_per_bin=1)
+    corners = _board_corners(35, 0)
+    accepted, key = view_selector.check(corners, IMAGE_SIZE)
+    assert accepted
+    view_selector.add(key)
+    assert view_selector.check(corners[::-1], IMAGE_SIZE) == (False, key)
+    assert view_selector.check(_board_corners(-35, 0), IMAGE_SIZE)[0]
@@ -0,0 +1,30 @@
+import threading
+
+import cv2
+import numpy as np
+
+from cam_loader import ImageLoader, list_images
+
+def _write_images(directory, count):
+    for index in range(count):
+        cv2.imwrite(str(directory / ('%02d.png' % index)), np.full((8, 8), index, np.uint8))
+    (directory / 'notes.txt').write_text('not an image')
+    return list_images(str(directory), ('.png',))
+
+def test_images_are_loaded_in_order(tmp_path):
+    image_paths = _write_images(tmp_path, 6)
+    broken_path = str(tmp_path / 'broken.png')
+    open(broken_path, 'wb').close()
+
+    loaded = list(ImageLoader(image_paths + [broken_path], prefetch=2))
+    assert [image_path for image_path, _ in loaded] == image_paths + [broken_path]
+    assert [int(image[0, 0]) for _, image in loaded[:-1]] == list(range(6))
+    assert loaded[-1][1] is None
+
+def test_stopping_early_releases_the_decoding_thread(tmp_path):
+    image_paths = _write_images(tmp_path, 10)
+    threads = threading.active_count()
+    for index, _ in enumerate(ImageLoader(image_paths, prefetch=1)):
+        if index == 1:
+            break
+    assert threading.active_count() == threads
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from cam_observations import ObservationStore
+
+def _board():
+    board_points = np.zeros((48, 3), np.float32)
+    board_points[:, :2] = np.mgrid[0:6, 0:8].T.reshape(-1, 2) * 0.108
+    return board_points
+
+def _corners(value):
+    return np.full((48, 1, 2), value, np.float32)
+
+def test_views_grow_and_keep_their_order():
+    store = ObservationStore(_board(), capacity=2)
+    for index in range(5):
+        assert store.add(_corners(index), 'view_%d' % index, timestamp=float(index)) == index
+
+    assert len(store) == 5 and len(store.corners) >= 5
+    assert store.image_points.shape == (5, 48, 2)
+    assert store.object_points.shape == (5, 48, 3)
+    assert [int(corners[0, 0]) for corners in store.image_points] == list(range(5))
+    objpoints, imgpoints, names = store.snapshot()
+    assert names == ['view_%d' % index for index in range(5)] and len(objpoints) == len(imgpoints) == 5
+
+def test_snapshot_is_not_changed_by_later_views():
+    for capacity in (1, 4):
+        store = ObservationStore(_board(), capacity=capacity)
+        store.add(_corners(1), 'first')
+        _, imgpoints, names = store.snapshot()
+        store.add(_corners(2), 'second')
+        assert len(imgpoints) == 1 and names == ['first'] and imgpoints[0, 0, 0] == 1
+
+def test_keep_compacts_the_views():
+    store = ObservationStore(_board())
+    for index in range(4):
+        store.add(_corners(index), 'view_%d' % index, sharpness=float(index))
+    store.keep([3, 1])
+    assert store.names == ['view_3', 'view_1']
+    assert [int(corners[0, 0]) for corners in store.image_points] == [3, 1]
+    assert list(store.sharpness[:len(store)]) == [3.0, 1.0]
+
+def test_wrong_corner_count_is_rejected():
+    store = ObservationStore(_board())
+    with pytest.raises(ValueError):
+        store.add(np.zeros((47, 2)), 'partial')
+
+def test_saved_store_loads_back(tmp_path):
+    store = ObservationStore(_board())
+    store.add(_corners(1), 'a', timestamp=10.0, sharpness=50.0, contrast=40.0)
+    store.add(_corners(2), 'b', timestamp=11.0)
+    store.save(str(tmp_path / 'views.bin'))
+
+    loaded = ObservationStore.load(str(tmp_path / 'views.bin'))
+    assert loaded.names == ['a', 'b']
+    assert np.array_equal(loaded.image_points, store.image_points)
+    assert np.array_equal(loaded.board_points, store.board_points)
+    assert list(loaded.timestamps[:2]) == [10.0, 11.0]
+    assert loaded.contrast[0] == 40.0 and np.isnan(loaded.contrast[1])
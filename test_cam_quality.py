@@ -0,0 +1,35 @@
+import cv2
+import numpy as np
+
+from cam_quality import frame_quality, FrameQualityFilter
+
+def _checkerboard(size=(480, 640), square=40):
+    rows, columns = np.indices(size)
+    return np.where((rows // square + columns // square) % 2 == 0, 230, 25).astype(np.uint8)
+
+def test_blur_and_low_contrast_lower_the_scores():
+    sharp = _checkerboard()
+    sharpness, contrast = frame_quality(sharp)
+    blurred_sharpness, _ = frame_quality(cv2.GaussianBlur(sharp, (0, 0), 8))
+    _, dark_contrast = frame_quality((sharp // 10).astype(np.uint8))
+    assert blurred_sharpness < sharpness / 10
+    assert dark_contrast < contrast / 5
+
+def test_filter_counts_and_estimates_the_saved_time():
+    sharp = _checkerboard()
+    sharpness, contrast = frame_quality(sharp)
+    frame_filter = FrameQualityFilter(min_sharpness=sharpness / 10, min_contrast=contrast / 5)
+
+    assert frame_filter.check(sharp)[0]
+    frame_filter.record_search(0.02, found=True)
+    frame_filter.record_search(0.5, found=False)
+    assert not frame_filter.check(cv2.GaussianBlur(sharp, (0, 0), 8))[0]
+    assert not frame_filter.check((sharp // 10).astype(np.uint8))[0]
+
+    assert (frame_filter.accepted, frame_filter.skipped_blurred, frame_filter.skipped_low_contrast) == (1, 1, 1)
+    # Skipped frames are estimated at the duration of a failed search
+    assert np.isclose(frame_filter.saved_seconds, 1.0)
+
+def test_filter_without_limits_accepts_everything():
+    frame_filter = FrameQualityFilter()
+    assert frame_filter.check(np.zeros((120, 160), np.uint8))[0]
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+from cam_reprojection import project_points, reprojection_errors, distort_normalized, undistort_normalized
+
+CAM_MAT = np.array([[600.0, 0, 322], [0, 605, 238], [0, 0, 1]])
+DIST_COEFF = np.array([-0.25, 0.08, 0.001, -0.0005, -0.01])
+
+def _poses(n_views=5, seed=0):
+    rng = np.random.default_rng(seed)
+    objp = np.zeros((48, 3), np.float32)
+    objp[:, :2] = np.mgrid[0:6, 0:8].T.reshape(-1, 2) * 0.05
+    rvecs = [rng.uniform(-0.4, 0.4, (3, 1)) for _ in range(n_views)]
+    tvecs = [np.array([[rng.uniform(-0.2, 0.0)], [rng.uniform(-0.2, 0.0)], [rng.uniform(0.8, 1.2)]]) for _ in range(n_views)]
+    return objp, rvecs, tvecs
+
+def test_projection_matches_opencv():
+    objp, rvecs, tvecs = _poses()
+    projected = project_points(objp, rvecs, tvecs, CAM_MAT, DIST_COEFF)
+    for view, (rvec, tvec) in enumerate(zip(rvecs, tvecs)):
+        expected = cv2.projectPoints(objp.astype(np.float64), rvec, tvec, CAM_MAT, DIST_COEFF)[0].reshape(-1, 2)
+        assert np.abs(projected[view] - expected).max() < 1e-6
+
+def test_errors_per_view_and_overall():
+    objp, rvecs, tvecs = _poses()
+    imgpoints = project_points(objp, rvecs, tvecs, CAM_MAT, DIST_COEFF).copy()
+    # One corner of view 2 off by 3-4-5 pixels
+    imgpoints[2, 7] += (3.0, 4.0)
+
+    errors = reprojection_errors(objp, imgpoints, rvecs, tvecs, CAM_MAT, DIST_COEFF)
+    assert np.isclose(errors['max'], 5.0) and np.isclose(errors['view_max'][2], 5.0)
+    assert np.isclose(errors['view_rms'][2], 5.0 / np.sqrt(48))
+    assert np.allclose(np.delete(errors['view_rms'], 2), 0.0, atol=1e-6)
+    assert np.isclose(errors['rms'], 5.0 / np.sqrt(5 * 48))
+
+def test_undistortion_inverts_the_distortion():
+    x, y = np.meshgrid(np.linspace(-0.5, 0.5, 11), np.linspace(-0.4, 0.4, 9))
+    x_distorted, y_distorted = distort_normalized(x, y, DIST_COEFF)
+    x_undistorted, y_undistorted = undistort_normalized(x_distorted, y_distorted, DIST_COEFF)
+    assert np.abs(x_undistorted - x).max() < 1e-6 and np.abs(y_undistorted - y).max() < 1e-6
@@ -0,0 +1,40 @@
+import cv2
+import numpy as np
+
+import cam_robust
+from cam_robust import RobustCalibration
+
+IMAGE_SIZE = (640, 480)
+CAM_MAT = np.array([[600.0, 0, 322], [0, 600, 238], [0, 0, 1]])
+DIST_COEFF = np.array([-0.2, 0.05, 0, 0, 0])
+
+def _views(n_views=12, noise=0.1, seed=0):
+    rng = np.random.default_rng(seed)
+    objp = np.zeros((48, 3), np.float32)
+    objp[:, :2] = np.mgrid[0:6, 0:8].T.reshape(-1, 2) * 0.05
+    objpoints, imgpoints = [], []
+    for _ in range(n_views):
+        rvec = rng.uniform(-0.4, 0.4, 3)
+        tvec = np.array([rng.uniform(-0.25, 0.05), rng.uniform(-0.25, 0.0), rng.uniform(0.8, 1.2)])
+        corners = cv2.projectPoints(objp.astype(np.float64), rvec, tvec, CAM_MAT, DIST_COEFF)[0].reshape(-1, 2)
+        objpoints.append(objp)
+        imgpoints.append((corners + rng.normal(0, noise, corners.shape)).astype(np.float32))
+    return objpoints, imgpoints
+
+def test_clean_views_start_no_workers(monkeypatch):
+    def get_context(method):
+        raise AssertionError('Worker pool started without outlier candidates.')
+    monkeypatch.setattr(cam_robust.multiprocessing, 'get_context', get_context)
+
+    objpoints, imgpoints = _views()
+    kept, rejected, result = RobustCalibration(workers=2).calibrate(objpoints, imgpoints, IMAGE_SIZE)
+    assert kept == list(range(len(imgpoints))) and rejected == []
+    assert result[0] < 0.3
+
+def test_outlier_view_is_rejected():
+    objpoints, imgpoints = _views()
+    # Half of the corners of one view shifted, e.g. a misdetected row order
+    imgpoints[4][:24] += 6.0
+    kept, rejected, result = RobustCalibration(workers=2).calibrate(objpoints, imgpoints, IMAGE_SIZE)
+    assert [index for index, _ in rejected] == [4]
+    assert 4 not in kept and result[0] < 0.3
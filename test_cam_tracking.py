@@ -0,0 +1,49 @@
+import numpy as np
+
+from cam_tracking import BoardTracker
+
+IMAGE_SIZE = (640, 480)
+CORNERS = np.array([[200.0, 150.0], [300.0, 150.0], [300.0, 250.0], [200.0, 250.0]])
+
+def test_region_follows_the_last_detection():
+    tracker = BoardTracker(padding=0.5, min_padding=8, refresh_interval=2)
+    assert tracker.search_region(IMAGE_SIZE) is None
+    tracker.update(CORNERS, IMAGE_SIZE, tracked=False)
+    assert tracker.search_region(IMAGE_SIZE) == (150, 100, 200, 200)
+
+    tracker.update(CORNERS, IMAGE_SIZE, tracked=True)
+    tracker.update(CORNERS, IMAGE_SIZE, tracked=True)
+    # Refresh with a full frame search after two tracked searches
+    assert tracker.search_region(IMAGE_SIZE) is None
+
+def test_miss_reset_and_resolution_change_search_the_full_frame():
+    tracker = BoardTracker()
+    tracker.update(CORNERS, IMAGE_SIZE, tracked=False)
+    assert tracker.search_region((1280, 720)) is None
+    tracker.update(None, IMAGE_SIZE, tracked=True)
+    assert tracker.search_region(IMAGE_SIZE) is None
+
+    tracker.update(CORNERS, IMAGE_SIZE, tracked=False)
+    tracker.reset()
+    assert tracker.search_region(IMAGE_SIZE) is None
+
+def test_miss_in_an_outdated_region_searches_the_same_frame_in_full():
+    from cam_calib import CameraCalibration
+
+    moved_corners = CORNERS + (250.0, 150.0)
+    searched_sizes = []
+    def corner_finder(gray_scale_frame):
+        # The board moved out of the tracked region, only the full frame holds it
+        searched_sizes.append(gray_scale_frame.shape[::-1])
+        if gray_scale_frame.shape[::-1] != IMAGE_SIZE:
+            return False, None
+        return True, moved_corners.reshape(-1, 1, 2).astype(np.float32)
+
+    cam_calib = CameraCalibration(track_board=True, corner_finder=corner_finder)
+    cam_calib.board_tracker.update(CORNERS, IMAGE_SIZE, tracked=False)
+    ret, corners = cam_calib._locate_corners(np.zeros(IMAGE_SIZE[::-1], np.uint8))
+
+    assert ret and np.allclose(corners.reshape(-1, 2), moved_corners)
+    assert searched_sizes == [(200, 200), IMAGE_SIZE]
+    # The next frame is searched around the new position
+    assert cam_calib.board_tracker.search_region(IMAGE_SIZE) == (400, 250, 200, 200)
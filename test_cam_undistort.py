@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+from cam_undistort import PointUndistorter, GRID_MAX_ERROR
+from cam_synthetic import default_camera
+
+# Same number of fixed-point iterations as the solver, OpenCV stops after 5 by default
+CRITERIA = (cv2.TERM_CRITERIA_COUNT, 20, 0)
+
+def _random_points(image_size, n_points=2000):
+    width, height = image_size
+    return np.random.default_rng(0).uniform((0, 0), (width - 1, height - 1), (n_points, 2))
+
+def test_solver_matches_opencv():
+    image_size = (640, 480)
+    cam_mat, dist_coeff = default_camera(image_size)
+    points = _random_points(image_size)
+    expected = cv2.undistortPoints(points.reshape(-1, 1, 2), cam_mat, dist_coeff, P=cam_mat, criteria=CRITERIA).reshape(-1, 2)
+
+    solved = PointUndistorter(cam_mat, dist_coeff).undistort_points(points, use_grid=False)
+    assert np.abs(solved - expected).max() < 1e-6
+
+def test_grid_step_follows_the_distortion():
+    for image_size in ((640, 480), (1920, 1080)):
+        cam_mat, dist_coeff = default_camera(image_size)
+        point_undistorter = PointUndistorter(cam_mat, dist_coeff)
+        accuracy = point_undistorter.build_grid(image_size)
+        assert accuracy['max'] <= GRID_MAX_ERROR
+
+        points = _random_points(image_size)
+        expected = cv2.undistortPoints(points.reshape(-1, 1, 2), cam_mat, dist_coeff, P=cam_mat, criteria=CRITERIA).reshape(-1, 2)
+        assert np.linalg.norm(point_undistorter.undistort_points(points) - expected, axis=1).max() <= GRID_MAX_ERROR
+
+    # The shorter focal length in pixels needs the finer grid
+    small_undistorter = PointUndistorter(*default_camera((640, 480)))
+    small_undistorter.build_grid((640, 480))
+    assert small_undistorter.grid_step < point_undistorter.grid_step
+
+def test_points_outside_the_grid_are_solved():
+    image_size = (640, 480)
+    cam_mat, dist_coeff = default_camera(image_size)
+    point_undistorter = PointUndistorter(cam_mat, dist_coeff)
+    point_undistorter.build_grid(image_size, grid_step=8)
+    points = np.array([[-20.0, 10.0], [700.0, 500.0]])
+    assert np.allclose(point_undistorter.undistort_points(points), point_undistorter.undistort_points(points, use_grid=False))